@@ -0,0 +1,265 @@
+"""Benchmark rez_manager on synthetic repositories.
+
+Every benchmark prints one JSON object per line, so results can be stored
+and compared between releases:
+
+    python benchmarks/run.py --families 5000 --output results.jsonl
+    python benchmarks/run.py --families 5000 --compare results.jsonl
+"""
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+import tempfile
+import statistics
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'src'), os.path.join(ROOT, 'vendors')]
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+os.environ.setdefault('MANAGER_SCAN_CACHE', '0')
+
+import rez.config  # noqa: E402
+from Qt import QtWidgets, QtCore  # noqa: E402
+
+from rez_manager import models, scan, workers  # noqa: E402
+from rez_manager.logview import LogModelHandler, LogView  # noqa: E402
+
+from synthetic import generate_repositories  # noqa: E402
+
+
+BENCHMARKS = []
+
+
+def benchmark(fn):
+    """Register a benchmark.
+
+    A benchmark does its setup and returns the function to time. It is called
+    again before every repeat, so the timed function may change the disk.
+    """
+    BENCHMARKS.append(fn)
+    return fn
+
+
+class Context(object):
+    def __init__(self, args, root):
+        self.args = args
+        self.root = root
+        self.repos = generate_repositories(
+            os.path.join(root, 'repos'), args.repos, args.families,
+            args.versions, args.variants, args.payload_size,
+        )
+        self.local_repo = self.repos[0]
+        self.work_folder = os.path.join(root, 'work')
+
+        config = rez.config._create_locked_config(dict(
+            packages_path=self.repos,
+            local_packages_path=self.local_repo,
+        ))
+        rez.config.config._swap(config)
+
+        self._rows = None
+
+    def rows(self):
+        if self._rows is None:
+            self._rows = list(scan.scan_rows(self.repos, self.args.workers))
+        return self._rows
+
+    def fresh_folder(self):
+        if os.path.exists(self.work_folder):
+            shutil.rmtree(self.work_folder)
+        os.makedirs(self.work_folder)
+        return self.work_folder
+
+
+@benchmark
+def bench_model_reload(ctx):
+    model = models.RezPackagesModel(max_workers=ctx.args.workers)
+    loop = QtCore.QEventLoop()
+    model.cookingEnded.connect(loop.quit)
+
+    def run():
+        model.reload()
+        loop.exec_()
+    return run
+
+
+@benchmark
+def bench_scan_rows(ctx):
+    # Replaces `RezPackagesModel._make_row`, rows are built by the scan
+    return lambda: list(scan.scan_rows(ctx.repos, ctx.args.workers))
+
+
+@benchmark
+def bench_family_rows(ctx):
+    rows = ctx.rows()
+    return lambda: [models.FamilyRow(name, cells) for name, cells in rows]
+
+
+@benchmark
+def bench_generate_item_tooltip(ctx):
+    cells = [cell for _, cells in ctx.rows() for cell in cells if cell.latest]
+    return lambda: [models.generate_item_tooltip(cell) for cell in cells]
+
+
+@benchmark
+def bench_delete_local(ctx):
+    folder = ctx.fresh_folder()
+    local_copy = os.path.join(folder, 'local')
+    shutil.copytree(ctx.local_repo, local_copy)
+    records = [
+        scan.PackageRecord(
+            cells[0].latest.name, cells[0].latest.version, local_copy
+        )
+        for _, cells in ctx.rows() if cells[0].latest
+    ]
+    worker = workers.DeleteWorker(records, local_copy, ctx.args.workers)
+
+    # Runs the deletions on the pool of the worker, without its thread
+    return worker.work
+
+
+def _localise(ctx, mode):
+    ctx.fresh_folder()
+    records = [
+        cells[1].latest for _, cells in ctx.rows() if cells[1].latest
+    ][:ctx.args.localise_count]
+    local_repo = os.path.join(ctx.work_folder, 'local')
+    os.makedirs(local_repo)
+    worker = workers.LocaliseWorker(
+        records, local_repo, ctx.args.workers, mode=mode
+    )
+
+    # Runs the copies on the pool of the worker, without its thread
+    return worker.work
+
+
+@benchmark
+def bench_localise(ctx):
+    return _localise(ctx, 'copy')
+
+
+@benchmark
+def bench_localise_link(ctx):
+    return _localise(ctx, 'link')
+
+
+@benchmark
+def bench_log_handler_emit(ctx):
+    log_view = LogView()
+    log_view.filter_edit.setText('message')
+    handler = LogModelHandler(log_view.model)
+    records = [
+        logging.LogRecord(
+            'rez_manager', logging.INFO, __file__, 0,
+            f'Message {i} with <tags> & entities', None, None
+        )
+        for i in range(ctx.args.log_records)
+    ]
+
+    def run():
+        for record in records:
+            handler.emit(record)
+        handler.flush_records()
+        QtWidgets.QApplication.processEvents()
+    # Keep the view, and so its model, alive while `run` is timed
+    run.log_view = log_view
+    return run
+
+
+def run_benchmark(fn, ctx):
+    timings = []
+    for _ in range(ctx.args.repeat):
+        timed = fn(ctx)
+        start = time.perf_counter()
+        timed()
+        timings.append(time.perf_counter() - start)
+    return dict(
+        name=fn.__name__[len('bench_'):],
+        min=min(timings),
+        median=statistics.median(timings),
+        max=max(timings),
+        repeat=ctx.args.repeat,
+        families=ctx.args.families,
+        repos=ctx.args.repos,
+        versions=ctx.args.versions,
+        variants=ctx.args.variants,
+    )
+
+
+def find_regressions(results, baseline_path, threshold):
+    with open(baseline_path) as f:
+        baseline = {
+            result['name']: result for result in map(json.loads, f)
+        }
+
+    regressions = []
+    for result in results:
+        previous = baseline.get(result['name'])
+        if previous and result['median'] > previous['median'] * (
+            1 + threshold
+        ):
+            regressions.append((result, previous))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repos', type=int, default=3)
+    parser.add_argument('--families', type=int, default=500)
+    parser.add_argument('--versions', type=int, default=3)
+    parser.add_argument('--variants', type=int, default=2)
+    parser.add_argument('--payload-size', type=int, default=1024)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--localise-count', type=int, default=20)
+    parser.add_argument('--log-records', type=int, default=5000)
+    parser.add_argument(
+        '-k', dest='pattern', default='',
+        help='Only run the benchmarks whose name contains this.'
+    )
+    parser.add_argument('--output', help='Also write the results here.')
+    parser.add_argument(
+        '--compare', metavar='BASELINE',
+        help='Exit with 1 if a median is slower than in this result file.'
+    )
+    parser.add_argument(
+        '--threshold', type=float, default=0.2,
+        help='Tolerated slowdown ratio for --compare. Defaults to 0.2.'
+    )
+    args = parser.parse_args()
+
+    app = QtWidgets.QApplication(sys.argv[:1])  # noqa: F841
+    root = tempfile.mkdtemp(prefix='rez_manager_bench_')
+    try:
+        ctx = Context(args, root)
+        results = []
+        for fn in BENCHMARKS:
+            if args.pattern not in fn.__name__:
+                continue
+            result = run_benchmark(fn, ctx)
+            results.append(result)
+            print(json.dumps(result), flush=True)
+    finally:
+        shutil.rmtree(root)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            for result in results:
+                f.write(json.dumps(result) + '\n')
+
+    if args.compare:
+        regressions = find_regressions(results, args.compare, args.threshold)
+        for result, previous in regressions:
+            print(
+                f"Regression in {result['name']}: {result['median']:.4f}s, "
+                f"was {previous['median']:.4f}s", file=sys.stderr
+            )
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""Generate synthetic rez repositories of any size.
+
+Example:
+    python benchmarks/synthetic.py /tmp/repos --families 5000 --repos 4
+"""
+import os
+import random
+import argparse
+
+
+PACKAGE_TEMPLATE = '''\
+name = {name!r}
+version = {version!r}
+description = {description!r}
+tools = {tools!r}
+variants = {variants!r}
+'''
+
+PYTHON_VERSIONS = ['2.7', '3.7', '3.9', '3.10', '3.11']
+
+
+def make_variants(count):
+    return [[f'python-{python}'] for python in PYTHON_VERSIONS[:count]]
+
+
+def write_package(repo, name, version, variants, payload_size):
+    """Write a package definition and a payload file per variant."""
+    folder = os.path.join(repo, name, version)
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, 'package.py'), 'w') as f:
+        f.write(PACKAGE_TEMPLATE.format(
+            name=name,
+            version=version,
+            description=f'Synthetic package {name}.',
+            tools=[f'{name}_tool'],
+            variants=variants,
+        ))
+
+    for variant in variants or [[]]:
+        variant_folder = os.path.join(folder, *variant)
+        os.makedirs(variant_folder, exist_ok=True)
+        with open(os.path.join(variant_folder, 'payload.bin'), 'wb') as f:
+            f.write(b'\0' * payload_size)
+
+
+def generate_repositories(
+    root, repos=3, families=100, versions=3, variants=2, payload_size=1024,
+    seed=0,
+):
+    """Fill `repos` repositories under `root` with synthetic packages.
+
+    Every family is spread over a random, non empty, subset of the
+    repositories, each holding a random subset of its versions.
+
+    Args:
+        root (str): Folder the repositories are created in.
+        repos (int): Number of repositories.
+        families (int): Number of package families.
+        versions (int): Number of versions per family.
+        variants (int): Number of variants per package, up to 5.
+        payload_size (int): Bytes of payload per variant.
+        seed (int): Seed of the random distribution.
+
+    Returns:
+        list: Paths of the repositories, the first one being meant as the
+            local repository.
+    """
+    rand = random.Random(seed)
+    repo_paths = [os.path.join(root, f'repo_{i}') for i in range(repos)]
+    for repo in repo_paths:
+        os.makedirs(repo, exist_ok=True)
+
+    for ifamily in range(families):
+        name = f'family_{ifamily:06d}'
+        all_versions = [f'1.{minor}.0' for minor in range(versions)]
+        holders = rand.sample(repo_paths, rand.randint(1, repos))
+        for repo in holders:
+            count = rand.randint(1, versions)
+            for version in rand.sample(all_versions, count):
+                write_package(
+                    repo, name, version, make_variants(variants),
+                    payload_size,
+                )
+    return repo_paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('root')
+    parser.add_argument('--repos', type=int, default=3)
+    parser.add_argument('--families', type=int, default=100)
+    parser.add_argument('--versions', type=int, default=3)
+    parser.add_argument('--variants', type=int, default=2)
+    parser.add_argument('--payload-size', type=int, default=1024)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for repo in generate_repositories(
+        args.root, args.repos, args.families, args.versions, args.variants,
+        args.payload_size, args.seed,
+    ):
+        print(repo)
+
+
+if __name__ == '__main__':
+    main()
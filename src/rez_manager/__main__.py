@@ -1,13 +1,97 @@
+import os
 import sys
+import time
+import argparse
+import importlib
 
-from Qt import QtWidgets
 
-from .window import ManagerWin
+# Imported in this order before the window is made, see `--import-times`
+STARTUP_MODULES = [
+    'Qt',
+    'rez.config',
+    'rez.packages',
+    'rez_manager.window',
+]
 
 
-if __name__ == '__main__':
+def _log_time(label, seconds):
+    print(f'{seconds * 1000:9.1f} ms  {label}', file=sys.stderr)
+
+
+def import_startup_modules(verbose=False):
+    for name in STARTUP_MODULES:
+        start = time.perf_counter()
+        importlib.import_module(name)
+        if verbose:
+            _log_time(f'import {name}', time.perf_counter() - start)
+
+
+def run_gui(import_times=False):
+    start = time.perf_counter()
+    import_startup_modules(import_times)
+
+    from Qt import QtWidgets, QtCore
+
+    from .window import ManagerWin
+
     app = QtWidgets.QApplication(sys.argv)
     win = ManagerWin()
     win.resize(1200, 600)
     win.show()
-    sys.exit(app.exec_())
+    if import_times:
+        _log_time('window shown', time.perf_counter() - start)
+        QtCore.QTimer.singleShot(0, lambda: _log_time(
+            'event loop running', time.perf_counter() - start
+        ))
+
+    # Scan once the event loop runs, so the window paints first
+    QtCore.QTimer.singleShot(0, win.start)
+    return app.exec_()
+
+
+def run_report(args):
+    from .report import write_report
+
+    try:
+        write_report(sys.stdout, args.format, args.workers)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # The reader went away, e.g. piped to `head`. Point stdout at devnull
+        # so flushing it at exit does not fail again.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='rez-manager')
+    parser.add_argument(
+        '--import-times', action='store_true',
+        help='Print how long the startup imports and the first paint take.'
+    )
+    subparsers = parser.add_subparsers(dest='command')
+    report_parser = subparsers.add_parser(
+        'report',
+        help='Print the latest version of every family in every repository, '
+             'without starting the GUI.'
+    )
+    report_parser.add_argument(
+        '--format', choices=['jsonl', 'csv'], default='jsonl',
+        help='One JSON object per line, or CSV with one column per '
+             'repository. Defaults to jsonl.'
+    )
+    report_parser.add_argument(
+        '--workers', type=int,
+        help='How many repositories are scanned at once. Defaults to '
+             '$MANAGER_SCAN_WORKERS or 8.'
+    )
+
+    # Leave the unknown arguments to Qt
+    args, _ = parser.parse_known_args()
+    if args.command == 'report':
+        return run_report(args)
+    return run_gui(args.import_times)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""Persistent cache of the package metadata shown in the spreadsheet.
+
+Entries are keyed by the modification times of the version folder and of the
+package file, so a package is only loaded by rez again once it changed on disk.
+The sizes of the version folders are kept too, keyed by the folder time.
+"""
+import os
+import json
+import sqlite3
+import logging
+import threading
+
+from .utils import env_int
+
+
+SCHEMA_VERSION = 2
+
+# Seconds a connection waits for another one to finish writing
+BUSY_TIMEOUT = 10
+
+logger = logging.getLogger(__name__)
+
+
+def user_cache_dir():
+    """Return the folder where rez_manager keeps its caches."""
+    if os.environ.get('MANAGER_CACHE_DIR'):
+        return os.environ['MANAGER_CACHE_DIR']
+    if os.name == 'nt':
+        root = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+    else:
+        root = os.environ.get(
+            'XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')
+        )
+    return os.path.join(root, 'rez_manager')
+
+
+class ScanCache(object):
+    """A SQLite store of package metadata, shared by the scanning threads.
+
+    Every worker opens its own connection. Each write is committed right
+    away, so no connection holds the write lock for long, and a failing
+    query is treated as a cache miss.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            path, timeout=BUSY_TIMEOUT, check_same_thread=False
+        )
+        self._setup()
+
+    def _setup(self):
+        with self._lock:
+            # Readers do not block the writer in WAL mode, and commits do not
+            # wait for the disk
+            try:
+                self._connection.execute('PRAGMA journal_mode=WAL')
+                self._connection.execute('PRAGMA synchronous=NORMAL')
+            except sqlite3.Error:
+                logger.debug('WAL mode unavailable.', exc_info=True)
+            version = self._connection.execute(
+                'PRAGMA user_version'
+            ).fetchone()[0]
+            if version != SCHEMA_VERSION:
+                self._connection.execute('DROP TABLE IF EXISTS packages')
+                self._connection.execute('DROP TABLE IF EXISTS sizes')
+                self._connection.execute(
+                    f'PRAGMA user_version = {SCHEMA_VERSION}'
+                )
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS packages ('
+                ' repo TEXT, family TEXT, version TEXT,'
+                ' folder_mtime REAL, file_mtime REAL,'
+                ' description TEXT, tools TEXT, variants TEXT,'
+                ' timestamp INTEGER,'
+                ' PRIMARY KEY (repo, family, version))'
+            )
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS sizes ('
+                ' folder TEXT PRIMARY KEY, mtime REAL, size INTEGER)'
+            )
+            self._connection.commit()
+
+    def get(self, repo, family, version, mtimes):
+        """Return the cached metadata of a package.
+
+        Args:
+            repo (str): Repository path.
+            family (str): Package family name.
+            version (str): Package version.
+            mtimes (tuple): `(folder_mtime, file_mtime)` the entry must match.
+
+        Returns:
+            dict: `description`, `tools`, `variants` and `timestamp`, or None
+                if the package is not cached or changed since.
+        """
+        row = self._read(
+            'SELECT folder_mtime, file_mtime, description, tools,'
+            ' variants, timestamp FROM packages'
+            ' WHERE repo=? AND family=? AND version=?',
+            (repo, family, version)
+        )
+        if not row or tuple(row[:2]) != tuple(mtimes):
+            return None
+        return dict(
+            description=row[2],
+            tools=json.loads(row[3]),
+            variants=json.loads(row[4]),
+            timestamp=row[5],
+        )
+
+    def put(self, repo, family, version, mtimes, metadata):
+        self._write(
+            'INSERT OR REPLACE INTO packages VALUES (?,?,?,?,?,?,?,?,?)',
+            (
+                repo, family, version, mtimes[0], mtimes[1],
+                metadata['description'],
+                json.dumps(metadata['tools']),
+                json.dumps(metadata['variants']),
+                metadata['timestamp'],
+            )
+        )
+
+    def get_size(self, folder, mtime):
+        """Return the cached size of a folder, None if it changed since."""
+        row = self._read(
+            'SELECT mtime, size FROM sizes WHERE folder=?', (folder,)
+        )
+        if not row or row[0] != mtime:
+            return None
+        return row[1]
+
+    def put_size(self, folder, mtime, size):
+        self._write(
+            'INSERT OR REPLACE INTO sizes VALUES (?,?,?)',
+            (folder, mtime, size)
+        )
+
+    def _read(self, query, parameters):
+        """Return the first row of `query`, None if it fails."""
+        with self._lock:
+            try:
+                return self._connection.execute(query, parameters).fetchone()
+            except sqlite3.Error:
+                logger.debug('Scan cache read failed.', exc_info=True)
+                return None
+
+    def _write(self, query, parameters):
+        """Run `query` and commit it, dropping it if it fails."""
+        with self._lock:
+            try:
+                self._connection.execute(query, parameters)
+                self._connection.commit()
+            except sqlite3.Error:
+                logger.debug('Scan cache write failed.', exc_info=True)
+                try:
+                    self._connection.rollback()
+                except sqlite3.Error:
+                    pass
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def open_scan_cache():
+    """Open the scan cache of the user.
+
+    Returns:
+        ScanCache: None if the cache is disabled with `MANAGER_SCAN_CACHE=0`
+            or can not be opened.
+    """
+    if not env_int('MANAGER_SCAN_CACHE', 1):
+        return None
+
+    folder = user_cache_dir()
+    try:
+        os.makedirs(folder, exist_ok=True)
+        return ScanCache(os.path.join(folder, 'scan.sqlite'))
+    except (OSError, sqlite3.Error):
+        logger.warning(f'Scan cache unavailable in {folder}.', exc_info=True)
+        return None
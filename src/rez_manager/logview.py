@@ -0,0 +1,182 @@
+import time
+import logging
+
+from Qt import QtCore, QtGui, QtWidgets
+
+from .textedithandler import BufferedHandler, log_color
+from .utils import RingBuffer, env_int
+
+
+DEFAULT_MAX_ENTRIES = 10000
+
+LEVELS = [
+    ('Debug', logging.DEBUG),
+    ('Info', logging.INFO),
+    ('Warning', logging.WARNING),
+    ('Error', logging.ERROR),
+]
+
+
+class LogEntry(object):
+    """What the log view keeps of a record."""
+    __slots__ = ('level', 'time', 'logger', 'message', 'lowered')
+
+    def __init__(self, level, time, logger, message):
+        self.level = level
+        self.time = time
+        self.logger = logger
+        self.message = message
+        # For the case insensitive filter
+        self.lowered = message.lower()
+
+    @classmethod
+    def from_record(cls, record, message):
+        return cls(record.levelno, record.created, record.name, message)
+
+
+class LogModel(QtCore.QAbstractListModel):
+    """The last `max_entries` log entries, one row each."""
+
+    def __init__(self, max_entries=None, dark_text=True, parent=None):
+        super(LogModel, self).__init__(parent)
+        if max_entries is None:
+            max_entries = env_int(
+                'MANAGER_LOG_MAX_ENTRIES', DEFAULT_MAX_ENTRIES
+            )
+        self.max_entries = max_entries
+        self.dark_text = dark_text
+        self._entries = RingBuffer(max_entries)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._entries)
+
+    def entry(self, row):
+        return self._entries[row]
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        entry = self._entries[index.row()]
+        if role == QtCore.Qt.DisplayRole:
+            # Multi-line messages, like tracebacks, are shown in the tooltip
+            return entry.message.split('\n', 1)[0]
+        if role == QtCore.Qt.ToolTipRole:
+            stamp = time.strftime('%H:%M:%S', time.localtime(entry.time))
+            return f'{stamp} {entry.logger}\n{entry.message}'
+        if role == QtCore.Qt.ForegroundRole:
+            return QtGui.QColor(log_color(entry.level, self.dark_text))
+        return None
+
+    def add_entries(self, entries):
+        """Append `entries`, dropping the oldest ones beyond `max_entries`."""
+        entries = entries[-self.max_entries:]
+        if not entries:
+            return
+
+        overflow = len(self._entries) + len(entries) - self.max_entries
+        if overflow > 0:
+            self.beginRemoveRows(QtCore.QModelIndex(), 0, overflow - 1)
+            self._entries.drop(overflow)
+            self.endRemoveRows()
+
+        start = len(self._entries)
+        self.beginInsertRows(
+            QtCore.QModelIndex(), start, start + len(entries) - 1
+        )
+        for entry in entries:
+            self._entries.append(entry)
+        self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self._entries.clear()
+        self.endResetModel()
+
+
+class LogFilterModel(QtCore.QSortFilterProxyModel):
+    """Filter the log entries by level and by text."""
+
+    def __init__(self, parent=None):
+        super(LogFilterModel, self).__init__(parent)
+        self._level = logging.DEBUG
+        self._text = ''
+
+    def set_level(self, level):
+        self._level = level
+        self.invalidateFilter()
+
+    def set_filter_text(self, text):
+        self._text = text.lower()
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        entry = self.sourceModel().entry(source_row)
+        return entry.level >= self._level and self._text in entry.lowered
+
+
+class LogModelHandler(BufferedHandler):
+    """Feed a `LogModel` from any thread, in batches."""
+
+    def __init__(self, model, level=logging.DEBUG):
+        super(LogModelHandler, self).__init__(model, model.max_entries, level)
+        self._model = model
+
+    def make_item(self, record):
+        return LogEntry.from_record(record, self.format(record))
+
+    def add_items(self, entries):
+        self._model.add_entries(entries)
+
+
+class LogView(QtWidgets.QWidget):
+    """The log panel: a level, a text filter and the filtered entries.
+
+    Only the visible rows are rendered, whatever the number of entries.
+    """
+
+    def __init__(self, max_entries=None, dark_text=True, parent=None):
+        super(LogView, self).__init__(parent)
+        self.model = LogModel(max_entries, dark_text, self)
+        self.proxy = LogFilterModel(self)
+        self.proxy.setSourceModel(self.model)
+
+        self.level_combo = QtWidgets.QComboBox()
+        for name, level in LEVELS:
+            self.level_combo.addItem(name, level)
+        self.filter_edit = QtWidgets.QLineEdit()
+        self.filter_edit.setPlaceholderText('Filter messages..')
+        self.filter_edit.setClearButtonEnabled(True)
+
+        self.list_view = QtWidgets.QListView()
+        self.list_view.setModel(self.proxy)
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setSelectionMode(self.list_view.ExtendedSelection)
+
+        filter_layout = QtWidgets.QHBoxLayout()
+        filter_layout.addWidget(self.level_combo)
+        filter_layout.addWidget(self.filter_edit)
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(filter_layout)
+        layout.addWidget(self.list_view)
+
+        self._at_bottom = True
+        self.level_combo.currentIndexChanged.connect(self._on_level_changed)
+        self.filter_edit.textChanged.connect(self.proxy.set_filter_text)
+        self.proxy.rowsAboutToBeInserted.connect(self._on_rows_coming)
+        self.proxy.rowsInserted.connect(self._on_rows_inserted)
+
+    def _on_level_changed(self, index):
+        self.proxy.set_level(self.level_combo.itemData(index))
+
+    def _on_rows_coming(self):
+        scrollbar = self.list_view.verticalScrollBar()
+        self._at_bottom = scrollbar.value() == scrollbar.maximum()
+
+    def _on_rows_inserted(self):
+        # Follow the new entries unless the user scrolled up
+        if self._at_bottom:
+            self.list_view.scrollToBottom()
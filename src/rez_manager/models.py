@@ -1,12 +1,23 @@
-import os
+import sys
 import logging
+from functools import partial
 
 from Qt import QtGui, QtCore
-from rez import packages
 from rez.config import config
-from rez.package_repository import package_repository_manager
 
-from .utils import catch_exception
+from .search import FamilyNameIndex
+from .scan import (
+    DEFAULT_SCAN_WORKERS, EMPTY_CELL, family_sort_key, find_winner,
+)
+from .utils import LRUCache, catch_exception, env_int, format_size
+from .watcher import RepositoryWatcher
+from .workers import FamiliesWorker, ScanWorker, SizesWorker, VersionsWorker
+
+
+DEFAULT_TOOLTIP_CACHE_SIZE = 512
+
+# Milliseconds to wait for more changes before refreshing families
+REFRESH_DELAY = 200
 
 
 def generate_item_tooltip(item):
@@ -21,19 +32,17 @@ def generate_item_tooltip(item):
     tooltip = []
 
     if latest.description:
-        tooltip.append(latest.format('Description: {description}'))
+        tooltip.append(f'Description: {latest.description}')
     if latest.variants:
         variants_string = ['Variants: ']
 
         # `latest.variants` Example:
         # [
-        #   [PackageRequest('python-2.7')],
-        #   [PackageRequest('python-3.7')],
+        #   ['python-2.7'],
+        #   ['python-3.7'],
         # ]
         for variant in latest.variants:
-            variant_str = ' * '
-            variant_str += ' | '.join(p.safe_str() for p in variant)
-            variants_string.append(variant_str)
+            variants_string.append(' * ' + ' | '.join(variant))
         tooltip.append('\n'.join(variants_string))
     if latest.tools:
         tooltip.append('Tools: ' + ', '.join(latest.tools))
@@ -51,70 +60,730 @@ def generate_item_text(item):
     return ''
 
 
-class RezPackagesModel(QtGui.QStandardItemModel):
+class FamilyRow(object):
+    """A row of the spreadsheet.
+
+    Empty cells all share `EMPTY_CELL`, so only the cells holding something
+    take memory.
+    """
+    __slots__ = ('name', 'key', 'cells', 'winner', 'versions', 'ranks')
+
+    def __init__(self, name, cells):
+        self.name = sys.intern(name)
+        self.key = family_sort_key(name)
+        # None until the `VersionRow` children are fetched
+        self.versions = None
+        self.set_cells(cells)
+
+    def set_cells(self, cells):
+        self.cells = [
+            cell if cell.latest or cell.empty_folder else EMPTY_CELL
+            for cell in cells
+        ]
+        self.winner = find_winner(self.cells)
+        # Sort keys of the versions, see `RezPackagesModel.update_ranks`
+        self.ranks = None
+
+    def is_empty(self):
+        return all(cell is EMPTY_CELL for cell in self.cells)
+
+    def has_packages(self):
+        return any(cell.latest for cell in self.cells)
+
+
+class VersionRow(object):
+    """A child row of a `FamilyRow`, showing which repositories hold a
+    version.
+    """
+    __slots__ = ('name', 'cells', 'winner')
+
+    def __init__(self, version, cells):
+        self.name = str(version)
+        self.cells = cells
+        # Rez picks the first repository holding the version
+        self.winner = next(
+            (i for i, cell in enumerate(cells) if cell.latest), -1
+        )
+
+
+class RezPackagesModel(QtCore.QAbstractItemModel):
     cookingStarted = QtCore.Signal()
     cookingEnded = QtCore.Signal()
+    # Number of families scanned, number of families in total
+    scanProgress = QtCore.Signal(int, int)
+    # A list of `RepoStats.snapshot`, one per repository
+    repoStatsChanged = QtCore.Signal(object)
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, max_workers=None):
+        super(RezPackagesModel, self).__init__(parent)
         self.repos = config.get('packages_path')
-        super(RezPackagesModel, self).__init__(0, len(self.repos) + 1)
-        self.setHorizontalHeaderLabels(['Package'] + self.repos)
+        self.headers = ['Package'] + self.repos
 
         self.logger = logging.getLogger(__name__)
+        self.max_workers = max_workers or env_int(
+            'MANAGER_SCAN_WORKERS', DEFAULT_SCAN_WORKERS
+        )
+        self._worker = None
+        self._reload_pending = False
+        self._first_result = False
+        # Rows of the previous reload, put back if this one is cancelled
+        self._previous_rows = None
+
+        # All the rows in sort order, the rows shown out of them and the
+        # position of each shown family
+        self._all_rows = []
+        self._rows = []
+        self._positions = {}
+        self._rows_by_name = {}
+        self._query = ''
+        self._sort_column = 0
+        self._sort_order = QtCore.Qt.AscendingOrder
+        self._ranks_dirty = False
+        self.name_index = FamilyNameIndex()
+        self._tooltips = LRUCache(env_int(
+            'MANAGER_TOOLTIP_CACHE_SIZE', DEFAULT_TOOLTIP_CACHE_SIZE
+        ))
+
+        self._families_to_refresh = set()
+        self._refresh_worker = None
+        self._refresh_timer = QtCore.QTimer(self)
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.setInterval(REFRESH_DELAY)
+        self._refresh_timer.timeout.connect(self._refresh_pending_families)
+
+        self._watcher = None
+        self._versions_workers = {}
+
+        # `{(family_name, irepo): (version_size, all_size)}`
+        self._sizes = {}
+        self._showing_sizes = bool(env_int('MANAGER_SHOW_SIZES', 0))
+        self._sizes_worker = None
+        self._families_to_size = set()
+
+    def is_cooking(self):
+        return self._worker is not None
+
+    def _row_at(self, index):
+        """Return the `FamilyRow` or `VersionRow` of a valid `index`."""
+        family_row = index.internalPointer()
+        if family_row is None:
+            return self._rows[index.row()]
+        return family_row.versions[index.row()]
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QtCore.QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, column)
+        return self.createIndex(row, column, self._rows[parent.row()])
+
+    def parent(self, index):
+        family_row = index.internalPointer() if index.isValid() else None
+        if family_row is None:
+            return QtCore.QModelIndex()
+        return self.createIndex(self._row_of(family_row.name), 0)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if not parent.isValid():
+            return len(self._rows)
+        if parent.internalPointer() is not None or parent.column() != 0:
+            return 0
+        return len(self._rows[parent.row()].versions or [])
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return len(self.headers)
+
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+        if not parent.isValid():
+            return bool(self._rows)
+        if parent.internalPointer() is not None or parent.column() != 0:
+            return False
+        return self._rows[parent.row()].has_packages()
+
+    def canFetchMore(self, parent):
+        if not parent.isValid() or parent.internalPointer() is not None:
+            return False
+        family_row = self._rows[parent.row()]
+        return family_row.versions is None and family_row.has_packages()
 
     @catch_exception
-    def _make_row(self, row, family_name):
-        self.setItem(row, 0, QtGui.QStandardItem(family_name))
-        versions = [None]
-        version_max = None
-
-        # Fill the spreadsheet
-        for irepo, repo in enumerate(self.repos):
-            latest = packages.get_latest_package(family_name, paths=[repo])
-            package_folder = os.path.join(repo, family_name)
-
-            item = QtGui.QStandardItem()
-            item.latest = None
-            item.empty_folder = None
-
-            if not latest:
-                versions.append(None)
-                if os.path.isdir(os.path.join(repo, family_name)):
-                    item.empty_folder = package_folder
-            else:
-                item.latest = latest
-
-                version_max = max(latest.version, version_max) \
-                    if version_max else latest.version
-                versions.append(latest.version or None)
-
-            item.setText(generate_item_text(item))
-
-            item.setToolTip(generate_item_tooltip(item))
-            self.setItem(row, irepo + 1, item)
-
-        # Find the winner
-        winner_found = False
-        for i in range(len(self.repos)):
-            if (
-                not winner_found and versions[i + 1] and
-                versions[i + 1] == version_max
-            ):
-                winner_found = True
-            else:
-                self.item(row, i + 1).setForeground(QtGui.QColor('gray'))
+    def fetchMore(self, parent):
+        """List the versions of a family in a worker thread."""
+        family_row = self._rows[parent.row()]
+        if family_row.name in self._versions_workers:
+            return
+
+        family_row.versions = []
+        worker = VersionsWorker(self.repos, family_row.name)
+        worker.versionsScanned.connect(self._on_versions_scanned)
+        worker.finished.connect(
+            partial(self._on_versions_finished, family_row.name)
+        )
+        self._versions_workers[family_row.name] = worker
+        worker.start()
+
+    @catch_exception
+    def _on_versions_scanned(self, family_name, versions):
+        family_row = self._rows_by_name.get(family_name)
+        # An empty list marks the versions being fetched, anything else means
+        # the family changed in the meantime
+        if family_row is None or family_row.versions != [] or not versions:
+            return
+
+        version_rows = [
+            VersionRow(version, cells) for version, cells in versions
+        ]
+        if family_name not in self._positions:
+            family_row.versions = version_rows
+            return
+        parent = self.index(self._row_of(family_name), 0)
+        self.beginInsertRows(parent, 0, len(versions) - 1)
+        family_row.versions = version_rows
+        self.endInsertRows()
+
+    def _on_versions_finished(self, family_name):
+        self._versions_workers.pop(family_name).wait()
+
+        family_row = self._rows_by_name.get(family_name)
+        if family_row is None:
+            return
+        # Nothing came back, like when the worker failed, let the family be
+        # expanded again
+        if family_row.versions == []:
+            family_row.versions = None
+            return
+        # Fetch again if the family was refreshed while fetching
+        if family_row.versions is None and family_name in self._positions:
+            parent = self.index(self._row_of(family_name), 0)
+            if self.canFetchMore(parent):
+                self.fetchMore(parent)
+
+    def _forget_versions(self, family_row):
+        """Drop the children of `family_row`, fetching them again if they were
+        shown.
+        """
+        if family_row.versions is None:
+            return
+        if family_row.name not in self._positions:
+            family_row.versions = None
+            return
+
+        parent = self.index(self._row_of(family_row.name), 0)
+        if family_row.versions:
+            self.beginRemoveRows(parent, 0, len(family_row.versions) - 1)
+            family_row.versions = None
+            self.endRemoveRows()
+            if self.canFetchMore(parent):
+                self.fetchMore(parent)
+        else:
+            family_row.versions = None
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal and \
+                role == QtCore.Qt.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        row = self._row_at(index)
+        irepo = index.column() - 1
+        if irepo < 0:
+            if role == QtCore.Qt.DisplayRole:
+                return row.name
+            return None
+
+        if role == QtCore.Qt.DisplayRole:
+            text = generate_item_text(row.cells[irepo])
+            sizes = self._sizes.get((row.name, irepo))
+            if sizes and index.internalPointer() is None:
+                text += self._format_sizes(*sizes)
+            return text
+        if role == QtCore.Qt.ToolTipRole:
+            if index.internalPointer() is not None:
+                return generate_item_tooltip(row.cells[irepo])
+            return self._tooltip(row, irepo)
+        if role == QtCore.Qt.ForegroundRole and irepo != row.winner:
+            return QtGui.QColor('gray')
+        return None
+
+    @staticmethod
+    def _format_sizes(version_size, all_size):
+        if version_size is None:
+            return f' ({format_size(all_size)})'
+        return f' ({format_size(version_size)} / {format_size(all_size)})'
+
+    def family_name(self, row):
+        return self._rows[row].name
+
+    def cell(self, index):
+        """Return the `PackageCell` at `index`, None for the first column."""
+        if not index.isValid() or index.column() == 0:
+            return None
+        return self._row_at(index).cells[index.column() - 1]
+
+    def _tooltip(self, family_row, irepo):
+        """Generate the tooltip of a cell the first time it is asked for."""
+        key = (family_row.name, irepo)
+        tooltip = self._tooltips.get(key)
+        if tooltip is None:
+            tooltip = generate_item_tooltip(family_row.cells[irepo])
+            self._tooltips[key] = tooltip
+        return tooltip
+
+    def _forget_tooltips(self, family_name):
+        for irepo in range(len(self.repos)):
+            self._tooltips.pop((family_name, irepo))
+
+    def _row_of(self, family_name):
+        return self._positions[family_name]
+
+    def _update_positions(self):
+        self._positions = {
+            family_row.name: row for row, family_row in enumerate(self._rows)
+        }
+
+    def update_ranks(self):
+        """Give every version a rank per repository column.
+
+        Ranks are computed once after the rows change, so sorting compares
+        integers instead of rez versions.
+        """
+        for family_row in self._all_rows:
+            family_row.ranks = [None] * len(self.repos)
+
+        for irepo in range(len(self.repos)):
+            versions = set(
+                family_row.cells[irepo].latest.version
+                for family_row in self._all_rows
+                if family_row.cells[irepo].latest
+            )
+            ranks = {
+                version: rank for rank, version in enumerate(sorted(versions))
+            }
+            for family_row in self._all_rows:
+                latest = family_row.cells[irepo].latest
+                if latest:
+                    family_row.ranks[irepo] = ranks[latest.version]
+        self._ranks_dirty = False
+
+    def _sort_key(self, column, order):
+        if column <= 0:
+            return lambda family_row: family_row.key
+
+        irepo = column - 1
+        sign = 1 if order == QtCore.Qt.AscendingOrder else -1
+
+        def key(family_row):
+            # Missing versions always go last, rows added since the ranks
+            # were updated too
+            rank = family_row.ranks and family_row.ranks[irepo]
+            if rank is None:
+                return 1, 0, family_row.key
+            return 0, sign * rank, family_row.key
+        return key
+
+    def sort(self, column, order=QtCore.Qt.AscendingOrder):
+        self._sort_column = column
+        self._sort_order = order
+        self._resort()
+
+    def _resort(self):
+        """Sort the rows again by the current sort column."""
+        self._relayout(sort=True)
+
+    def set_filter_text(self, text):
+        """Only show the families whose name contains `text`.
+
+        A text starting with `^` matches the beginning of the names. The
+        shown rows are picked from what `name_index` finds, instead of
+        filtering each row through a proxy model.
+        """
+        self._query = text.strip()
+        self._relayout(sort=False)
+
+    def _matches(self, family_name):
+        """Whether a family added to the rows is shown, see `set_filter_text`.
+        """
+        query = self._query.lower()
+        if query.startswith('^'):
+            return family_name.lower().startswith(query[1:])
+        return query in family_name.lower()
+
+    def _filter_rows(self):
+        if not self._query:
+            return list(self._all_rows)
+        if self._query.startswith('^'):
+            accepted = self.name_index.prefixed(self._query[1:])
+        else:
+            accepted = self.name_index.search(self._query)
+        return [
+            family_row for family_row in self._all_rows
+            if family_row.name in accepted
+        ]
+
+    def _relayout(self, sort):
+        """Sort the rows if `sort` and filter them again."""
+        column, order = self._sort_column, self._sort_order
+        if sort and column > 0 and self._ranks_dirty:
+            self.update_ranks()
+
+        self.layoutAboutToBeChanged.emit()
+        try:
+            old_indexes = self.persistentIndexList()
+            # The family row of each index, and whether it is a version
+            old_rows = [
+                (self._rows[index.row()], False)
+                if index.internalPointer() is None
+                else (index.internalPointer(), True)
+                for index in old_indexes
+            ]
+            if sort:
+                self._all_rows.sort(
+                    key=self._sort_key(column, order),
+                    reverse=(
+                        column <= 0 and order == QtCore.Qt.DescendingOrder
+                    ),
+                )
+            self._rows = self._filter_rows()
+            self._update_positions()
+
+            new_indexes = []
+            for index, (family_row, is_version) in zip(old_indexes, old_rows):
+                row = self._positions.get(family_row.name)
+                if row is None:
+                    new_indexes.append(QtCore.QModelIndex())
+                elif is_version:
+                    new_indexes.append(index)
+                else:
+                    new_indexes.append(self.createIndex(row, index.column()))
+            self.changePersistentIndexList(old_indexes, new_indexes)
+        finally:
+            self.layoutChanged.emit()
+
+    def _row_changed(self, row):
+        self.dataChanged.emit(
+            self.index(row, 1), self.index(row, len(self.repos))
+        )
+
+    def _remove_family(self, family_name):
+        family_row = self._rows_by_name.pop(family_name)
+        self._all_rows.remove(family_row)
+        self.name_index.discard(family_name)
+        row = self._positions.get(family_name)
+        if row is not None:
+            self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+            del self._rows[row]
+            self._update_positions()
+            self.endRemoveRows()
+        self._forget_tooltips(family_name)
+        self._forget_sizes(family_name)
+
+    def _clear_rows(self):
+        self.beginResetModel()
+        self._all_rows = []
+        self._rows = []
+        self._positions = {}
+        self._rows_by_name = {}
+        self.name_index.clear()
+        self._tooltips.clear()
+        self._sizes.clear()
+        self.endResetModel()
+
+    def _add_families(self, family_names):
+        """Add empty rows for `family_names`, in sort order."""
+        if not family_names:
+            return
+
+        empty_cells = [EMPTY_CELL] * len(self.repos)
+        self._append_rows([
+            FamilyRow(family_name, empty_cells)
+            for family_name in family_names
+        ])
+        # The new rows have no ranks yet
+        self._ranks_dirty = True
+        self._resort()
+
+    def _append_rows(self, family_rows):
+        """Append rows at the end, showing those matching the filter.
+
+        Families already in the rows are skipped.
+        """
+        family_rows = [
+            family_row for family_row in family_rows
+            if family_row.name not in self._rows_by_name
+        ]
+        self._all_rows.extend(family_rows)
+        for family_row in family_rows:
+            self._rows_by_name[family_row.name] = family_row
+            self.name_index.add(family_row.name)
+
+        shown = [
+            family_row for family_row in family_rows
+            if self._matches(family_row.name)
+        ]
+        if not shown:
+            return
+        start = len(self._rows)
+        self.beginInsertRows(
+            QtCore.QModelIndex(), start, start + len(shown) - 1
+        )
+        for family_row in shown:
+            self._positions[family_row.name] = len(self._rows)
+            self._rows.append(family_row)
+        self.endInsertRows()
 
     @catch_exception
     def reload(self):
+        """Rescan all the repositories in a worker thread.
+
+        A reload requested while another one is running supersedes it: the
+        running one is cancelled and the new one starts once it stopped.
+        """
+        if self.is_cooking():
+            if not self._worker.is_cancelled():
+                self.logger.info('Restarting the reload..')
+                self._worker.cancel()
+            self._reload_pending = True
+            return
+
+        # The rows being measured are about to be replaced, they are
+        # measured again once the reload has finished
+        self._cancel_sizes()
         self.logger.info('Reloading..')
-        package_repository_manager.clear_caches()
-        family_names = list(set(
-            f.name for f in packages.iter_package_families()
-        ))
-        self.setRowCount(len(family_names))
-        family_names.sort(key=lambda x: x.lower())
+        self._first_result = True
+        self._worker = ScanWorker(self.repos, self.max_workers)
+        self._worker.rowsScanned.connect(self._on_rows_scanned)
+        self._worker.progress.connect(self.scanProgress)
+        self._worker.statsUpdated.connect(self.repoStatsChanged)
+        self._worker.finished.connect(self._on_scan_finished)
+        self.cookingStarted.emit()
+        self._worker.start()
+
+    def cancel_reload(self):
+        """Stop the running reload at the next family, showing the rows of
+        the previous reload again.
+        """
+        self._reload_pending = False
+        if self.is_cooking() and not self._worker.is_cancelled():
+            self.logger.info('Cancelling the reload..')
+            self._worker.cancel()
+
+    def refresh_families(self, family_names):
+        """Rescan the rows of `family_names` only.
+
+        Requests arriving in a short time are merged into one rescan.
+        """
+        self._families_to_refresh.update(family_names)
+        self._refresh_timer.start()
+
+    @catch_exception
+    def _refresh_pending_families(self):
+        if self.is_cooking() or self._refresh_worker:
+            # Try again once the running scan is done
+            return
+
+        family_names = sorted(self._families_to_refresh)
+        self._families_to_refresh.clear()
+        if not family_names:
+            return
+
+        self.logger.info(f'Refreshing {len(family_names)} package(s)..')
+        self._refresh_worker = FamiliesWorker(self.repos, family_names)
+        self._refresh_worker.familiesScanned.connect(self._on_families_scanned)
+        self._refresh_worker.finished.connect(self._on_refresh_finished)
+        self._refresh_worker.start()
+
+    @catch_exception
+    def _on_families_scanned(self, rows):
+        if self.is_cooking():
+            # A reload started meanwhile and is replacing the rows, refresh
+            # these families again once it is done
+            self._families_to_refresh.update(rows)
+            return
+
+        found = set(
+            family_name for family_name, cells in rows.items()
+            if any(cell.latest or cell.empty_folder for cell in cells)
+        )
+        self._add_families(found.difference(self._rows_by_name))
+        for family_name, cells in rows.items():
+            if family_name not in found:
+                if family_name in self._rows_by_name:
+                    self._remove_family(family_name)
+                continue
+
+            family_row = self._rows_by_name[family_name]
+            family_row.set_cells(cells)
+            self._forget_tooltips(family_name)
+            self._forget_sizes(family_name)
+            if family_name in self._positions:
+                self._row_changed(self._row_of(family_name))
+            self._forget_versions(family_row)
+
+        self._ranks_dirty = True
+        if self._sort_column > 0:
+            self._resort()
+        self.measure_sizes(found)
+
+    def _on_refresh_finished(self):
+        self._refresh_worker.wait()
+        self._refresh_worker = None
+        if self._families_to_refresh:
+            self._refresh_timer.start()
+
+    def set_watching(self, enabled):
+        """Refresh rows by themselves when the local repository changes."""
+        if not enabled:
+            if self._watcher:
+                self._watcher.stop()
+                self._watcher = None
+            return
+
+        local_repo = config.get('local_packages_path')
+        if self._watcher or local_repo not in self.repos:
+            return
+        self._watcher = RepositoryWatcher(local_repo, self)
+        self._watcher.familiesChanged.connect(self.refresh_families)
+        self._watcher.start()
+
+    def is_watching(self):
+        return self._watcher is not None
+
+    def set_showing_sizes(self, enabled):
+        """Show the disk usage of the version and of all the versions of
+        the families in the cells.
+        """
+        self._showing_sizes = enabled
+        if enabled:
+            self.measure_sizes(self._rows_by_name)
+        else:
+            self._cancel_sizes()
+            self._sizes.clear()
+        if self._rows:
+            self.dataChanged.emit(
+                self.index(0, 1),
+                self.index(len(self._rows) - 1, len(self.repos)),
+            )
+
+    def is_showing_sizes(self):
+        return self._showing_sizes
+
+    def measure_sizes(self, family_names):
+        """Measure the disk usage of `family_names` in a worker thread."""
+        if not self._showing_sizes:
+            return
+        self._families_to_size.update(family_names)
+        if self._sizes_worker or not self._families_to_size:
+            return
+
+        jobs = []
+        for family_name in sorted(self._families_to_size):
+            family_row = self._rows_by_name.get(family_name)
+            if family_row is None:
+                continue
+            for irepo, cell in enumerate(family_row.cells):
+                if cell.latest:
+                    version = str(cell.latest.version)
+                elif cell.empty_folder:
+                    version = None
+                else:
+                    continue
+                jobs.append((family_name, irepo, self.repos[irepo], version))
+        self._families_to_size.clear()
+
+        self._sizes_worker = SizesWorker(jobs, self.max_workers)
+        self._sizes_worker.sizesComputed.connect(self._on_sizes_computed)
+        self._sizes_worker.finished.connect(self._on_sizes_finished)
+        self._sizes_worker.start()
+
+    def _cancel_sizes(self):
+        """Drop the sizes to measure and stop the running measure."""
+        self._families_to_size.clear()
+        if self._sizes_worker:
+            self._sizes_worker.cancel()
+
+    def _forget_sizes(self, family_name):
+        for irepo in range(len(self.repos)):
+            self._sizes.pop((family_name, irepo), None)
+
+    @catch_exception
+    def _on_sizes_computed(self, sizes):
+        if not self._showing_sizes or self._sizes_worker is None or \
+                self._sizes_worker.is_cancelled():
+            return
+        self._sizes.update(sizes)
+        for family_name, irepo in sizes:
+            row = self._positions.get(family_name)
+            if row is not None:
+                index = self.index(row, irepo + 1)
+                self.dataChanged.emit(index, index)
+
+    def _on_sizes_finished(self):
+        self._sizes_worker.wait()
+        self._sizes_worker = None
+        self.measure_sizes(())
+
+    def wait(self):
+        """Block until the running scans, if any, have finished."""
+        self._reload_pending = False
+        self._refresh_timer.stop()
+        # Sizes are only a display, no need to finish measuring them
+        self._families_to_size.clear()
+        if self._sizes_worker:
+            self._sizes_worker.cancel()
+            self._sizes_worker.wait()
+        if self._worker:
+            self._worker.wait()
+        if self._refresh_worker:
+            self._refresh_worker.wait()
+        for worker in list(self._versions_workers.values()):
+            worker.wait()
+
+    @catch_exception
+    def _on_rows_scanned(self, rows):
+        """Append a batch of rows, they come in sorted order."""
+        if self._worker is None or self._worker.is_cancelled():
+            return
+        if self._first_result:
+            self._first_result = False
+            self._previous_rows = self._all_rows
+            self._clear_rows()
+
+        self._append_rows([
+            FamilyRow(family_name, cells) for family_name, cells in rows
+        ])
+
+    def _on_scan_finished(self):
+        self._worker.wait()
+        cancelled = self._worker.is_cancelled()
+        self._worker = None
+
+        previous_rows, self._previous_rows = self._previous_rows, None
+        # A cancelled reload that showed nothing leaves the old rows alone,
+        # one that showed some puts the old rows back instead of a truncated
+        # spreadsheet
+        if cancelled and previous_rows is not None:
+            self._clear_rows()
+            self._append_rows(previous_rows)
+        elif self._first_result and not cancelled:
+            self._clear_rows()
+        self.update_ranks()
+        self._resort()
+        if cancelled:
+            self.logger.info(
+                f'Reload cancelled, {len(self._all_rows)} packages kept.'
+            )
+        else:
+            self.logger.info(f'{len(self._all_rows)} packages collected.')
+        self.cookingEnded.emit()
+        self.measure_sizes(self._rows_by_name)
 
-        for row, family_name in enumerate(family_names):
-            self._make_row(row, family_name)
+        if self._reload_pending:
+            self._reload_pending = False
+            self.reload()
+        elif self._families_to_refresh:
+            self._refresh_timer.start()
 
-        self.logger.info(f'{len(family_names)} packages collected.')
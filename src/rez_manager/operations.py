@@ -0,0 +1,378 @@
+"""Changes made to the repositories on disk.
+
+Nothing in here touches Qt, so these functions are safe to call from a worker
+thread.
+"""
+import os
+import time
+import shutil
+import logging
+import tempfile
+from collections import Counter
+
+from .scan import PackageRecord, PACKAGE_FILES
+
+
+# `copy` copies the payloads. `link` clones or hardlinks the files and
+# `symlink` links to the remote payloads, both copy what they can not link.
+LOCALISE_MODES = ('copy', 'link', 'symlink')
+
+# ioctl cloning a file on copy-on-write file systems, like Btrfs and XFS
+FICLONE = 0x40049409
+
+# Files removed between two progress reports of `remove_tree`
+REPORT_INTERVAL = 200
+
+# Hidden folder of the local repository holding the deleted folders until
+# they are purged, rez ignores it
+QUARANTINE_FOLDER = '.deleted'
+# Each deleted folder is moved into an entry of the quarantine folder, next
+# to a file holding its original path
+ENTRY_CONTENT = 'folder'
+ENTRY_ORIGIN = 'origin'
+# Prefix of the entries being purged, they can not be restored anymore
+PURGING_PREFIX = 'purging-'
+
+logger = logging.getLogger(__name__)
+
+
+def variant_requires():
+    """Return the requirements a variant must not conflict with to be used.
+
+    These are the implicit packages of rez, like the platform and the arch,
+    plus the space separated requirements of `MANAGER_VARIANT_REQUIRES`,
+    for example `python-3.9`.
+    """
+    from rez.config import config
+
+    return list(config.implicit_packages) + \
+        os.environ.get('MANAGER_VARIANT_REQUIRES', '').split()
+
+
+def matching_variants(package, requires):
+    """Return the indexes of the variants not conflicting with `requires`.
+
+    Args:
+        package (PackageRecord): The package whose variants are checked.
+        requires (list[str]): Requirements, see `variant_requires`.
+    """
+    from rez.utils.formatting import PackageRequest
+
+    requests = [PackageRequest(request) for request in requires]
+    return [
+        i for i, variant in enumerate(package.variants)
+        if not any(
+            PackageRequest(request).conflicts_with(other)
+            for request in variant for other in requests
+        )
+    ]
+
+
+def missing_variants(package, local_repo):
+    """Return the indexes of the variants not in the local repository yet."""
+    local = PackageRecord(package.name, package.version, local_repo)
+    local_package = local.package()
+    if local_package is None:
+        return list(range(len(package.variants)))
+
+    local_variants = set(
+        tuple(variant)
+        for variant in PackageRecord.from_package(
+            local_package, local_repo
+        ).variants
+    )
+    return [
+        i for i, variant in enumerate(package.variants)
+        if tuple(variant) not in local_variants
+    ]
+
+
+def localise_mode():
+    """Return the localise mode set by `MANAGER_LOCALISE_MODE`."""
+    mode = os.environ.get('MANAGER_LOCALISE_MODE', 'copy')
+    if mode not in LOCALISE_MODES:
+        logger.warning(f'Unknown localise mode {mode}, copying instead.')
+        return 'copy'
+    return mode
+
+
+def reflink(src, dst):
+    """Clone a file, sharing its blocks until either copy is modified."""
+    import fcntl
+
+    with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+        try:
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+        except OSError:
+            dst_file.close()
+            os.remove(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+def _link_file(src, dst, methods, counts):
+    # A method failing once, like hardlinks across devices, is not tried
+    # again for this package
+    for method in list(methods):
+        try:
+            method(src, dst)
+        except (OSError, ImportError):
+            methods.remove(method)
+            continue
+        counts[method.__name__] += 1
+        return
+    shutil.copy2(src, dst)
+    counts['copy2'] += 1
+
+
+def link_tree(src, dst, methods, counts, skip=()):
+    """Recreate the folder `src` at `dst`, linking the files if possible.
+
+    Args:
+        src (str): Folder to recreate.
+        dst (str): Where to recreate it.
+        methods (list[callable]): Functions linking a file, tried in order.
+            The ones failing are removed from the list.
+        counts (Counter): Number of files put in place by each method.
+        skip (tuple[str]): Names of the entries of `src` to leave out.
+    """
+    os.makedirs(dst, exist_ok=True)
+    for entry in os.scandir(src):
+        if entry.name in skip:
+            continue
+        target = os.path.join(dst, entry.name)
+        if entry.is_symlink():
+            os.symlink(os.readlink(entry.path), target)
+        elif entry.is_dir():
+            link_tree(entry.path, target, methods, counts)
+        else:
+            _link_file(entry.path, target, methods, counts)
+
+
+def _symlink_tree(src, dst, methods, counts, skip=()):
+    os.makedirs(dst, exist_ok=True)
+    for entry in os.scandir(src):
+        if entry.name in skip:
+            continue
+        target = os.path.join(dst, entry.name)
+        try:
+            os.symlink(
+                entry.path, target, target_is_directory=entry.is_dir()
+            )
+            counts['symlink'] += 1
+        except OSError:
+            if entry.is_dir():
+                link_tree(entry.path, target, methods, counts)
+            else:
+                _link_file(entry.path, target, methods, counts)
+
+
+def link_payload(src_root, dst_root, symlink=False, skip=()):
+    """Put the payload of a variant in place without copying it if possible.
+
+    Returns:
+        Counter: Number of files put in place by each method.
+    """
+    methods = [reflink, os.link]
+    counts = Counter()
+    if symlink:
+        _symlink_tree(src_root, dst_root, methods, counts, skip)
+    else:
+        link_tree(src_root, dst_root, methods, counts, skip)
+    return counts
+
+
+def localise_package(
+        package, local_repo, matching=False, missing=False, mode='copy',
+):
+    """Copy a package to the local repository, keeping its timestamp.
+
+    Args:
+        package (PackageRecord): The package to copy.
+        local_repo (str): Path of the local repository.
+        matching (bool): Only copy the variants usable here, see
+            `variant_requires`.
+        missing (bool): Only copy the variants the local repository lacks.
+        mode (str): One of `LOCALISE_MODES`.
+
+    Returns:
+        dict: What `copy_package` returns, None if there was nothing to copy.
+    """
+    from rez.package_copy import copy_package
+
+    variants = None
+    if package.variants and (matching or missing):
+        variants = range(len(package.variants))
+        if matching:
+            variants = matching_variants(package, variant_requires())
+        if missing:
+            absent = missing_variants(package, local_repo)
+            variants = [i for i in variants if i in absent]
+        if not variants:
+            logger.info(
+                f'{package.name}-{package.version}: no variant to copy.'
+            )
+            return None
+
+    if mode == 'copy':
+        return copy_package(
+            package.package(), local_repo, variants=variants,
+            keep_timestamp=True,
+        )
+
+    result = copy_package(
+        package.package(), local_repo, variants=variants,
+        keep_timestamp=True, skip_payload=True,
+    )
+    counts = Counter()
+    for src_variant, dst_variant in result['copied']:
+        # The root of a package without variants holds its definition,
+        # which `copy_package` already wrote
+        counts.update(link_payload(
+            src_variant.root, dst_variant.root, symlink=mode == 'symlink',
+            skip=() if src_variant.subpath else PACKAGE_FILES,
+        ))
+    logger.debug(
+        f'{package.name}-{package.version} files: '
+        + ', '.join(f'{count} by {name}' for name, count in counts.items())
+    )
+    return result
+
+
+def local_folder(package, all_version):
+    """Return the folder to delete to remove a package.
+
+    Args:
+        package (PackageRecord): A package of the local repository.
+        all_version (bool): Remove every version of the package family.
+    """
+    package_dir = os.path.join(package.location, package.name)
+    if all_version:
+        return package_dir
+
+    # Remove package folder instead of version folder to avoid leaving
+    # empty folder
+    children = os.listdir(package_dir)
+    if len(children) == 1:
+        assert children[0] == str(package.version)
+        return package_dir
+    return os.path.join(package_dir, str(package.version))
+
+
+def remove_tree(folder, on_removed=None, cancelled=None):
+    """Delete a folder, reporting the files and bytes removed as it goes.
+
+    Args:
+        folder (str): Folder to delete.
+        on_removed (callable): Called with the number of files and bytes
+            removed since its previous call.
+        cancelled (threading.Event): Stop once set, leaving the folder
+            partially deleted.
+
+    Returns:
+        tuple: The number of files and bytes removed.
+    """
+    totals = [0, 0]
+    pending = [0, 0]
+
+    def report():
+        if on_removed and pending[0]:
+            on_removed(*pending)
+        totals[0] += pending[0]
+        totals[1] += pending[1]
+        pending[:] = [0, 0]
+
+    def remove(path):
+        for entry in list(os.scandir(path)):
+            if cancelled is not None and cancelled.is_set():
+                return
+            if entry.is_dir(follow_symlinks=False):
+                remove(entry.path)
+                continue
+            size = entry.stat(follow_symlinks=False).st_size
+            os.unlink(entry.path)
+            pending[0] += 1
+            pending[1] += size
+            if pending[0] >= REPORT_INTERVAL:
+                report()
+        os.rmdir(path)
+
+    try:
+        remove(folder)
+    finally:
+        report()
+    return tuple(totals)
+
+
+def quarantine(folder, repo):
+    """Delete a folder by moving it into the quarantine folder of `repo`.
+
+    The move is a rename, so `folder` must be on the same device as `repo`.
+
+    Returns:
+        str: The quarantine entry, to give to `restore`.
+    """
+    root = os.path.join(repo, QUARANTINE_FOLDER)
+    os.makedirs(root, exist_ok=True)
+    entry = tempfile.mkdtemp(prefix=f'{time.time():.0f}-', dir=root)
+    origin = os.path.join(entry, ENTRY_ORIGIN)
+    with open(origin, 'w') as f:
+        f.write(os.path.abspath(folder))
+    try:
+        os.rename(folder, os.path.join(entry, ENTRY_CONTENT))
+    except OSError:
+        os.remove(origin)
+        os.rmdir(entry)
+        raise
+    return entry
+
+
+def restore(entry):
+    """Move a folder deleted by `quarantine` back where it was.
+
+    Returns:
+        str: The restored folder.
+    """
+    with open(os.path.join(entry, ENTRY_ORIGIN)) as f:
+        origin = f.read()
+    if os.path.exists(origin):
+        raise FileExistsError(f'{origin} exists again.')
+    os.makedirs(os.path.dirname(origin), exist_ok=True)
+    os.rename(os.path.join(entry, ENTRY_CONTENT), origin)
+    remove_tree(entry)
+    return origin
+
+
+def purge_quarantine(repo, older_than, cancelled=None):
+    """Delete for good the quarantine entries of `repo` older than a delay.
+
+    Args:
+        repo (str): The local repository.
+        older_than (float): Seconds an entry is kept for `restore`.
+        cancelled (threading.Event): Stop once set, the interrupted entry is
+            purged on the next call.
+
+    Returns:
+        int: Number of entries purged.
+    """
+    root = os.path.join(repo, QUARANTINE_FOLDER)
+    try:
+        entries = list(os.scandir(root))
+    except FileNotFoundError:
+        return 0
+
+    purged = 0
+    now = time.time()
+    for entry in entries:
+        if cancelled is not None and cancelled.is_set():
+            break
+        path = entry.path
+        if not entry.name.startswith(PURGING_PREFIX):
+            if now - entry.stat().st_mtime < older_than:
+                continue
+            # Renamed first, so `restore` never sees a half purged entry
+            path = os.path.join(root, PURGING_PREFIX + entry.name)
+            os.rename(entry.path, path)
+        remove_tree(path, cancelled=cancelled)
+        purged += 1
+    return purged
@@ -0,0 +1,88 @@
+"""Headless report of the package matrix.
+
+Runs the same scan as the spreadsheet without Qt and streams one record per
+family, so it can be used in cron jobs and CI.
+"""
+import csv
+import json
+
+from rez.config import config
+
+from . import scan
+from .cache import open_scan_cache
+from .utils import env_int
+
+
+def make_record(repos, family_name, cells):
+    """Describe one row of the spreadsheet.
+
+    Returns:
+        dict: `family`, `versions` mapping each repository to its latest
+            version (None if missing), `empty_folders`, the `winner`
+            repository and the `shadowed` repositories holding a version.
+    """
+    winner = scan.find_winner(cells)
+    return dict(
+        family=family_name,
+        versions={
+            repo: str(cell.latest.version) if cell.latest else None
+            for repo, cell in zip(repos, cells)
+        },
+        empty_folders=[
+            repo for repo, cell in zip(repos, cells) if cell.empty_folder
+        ],
+        winner=repos[winner] if winner >= 0 else None,
+        shadowed=[
+            repo for irepo, (repo, cell) in enumerate(zip(repos, cells))
+            if cell.latest and irepo != winner
+        ],
+    )
+
+
+def iter_records(repos, max_workers, cache=None):
+    """Scan `repos` and yield the record of each family in sorted order."""
+    for rows, _ in scan.iter_row_batches(repos, max_workers, cache):
+        for family_name, cells in rows:
+            yield make_record(repos, family_name, cells)
+
+
+def write_jsonl(stream, repos, records):
+    for record in records:
+        stream.write(json.dumps(record) + '\n')
+
+
+def write_csv(stream, repos, records):
+    writer = csv.writer(stream)
+    writer.writerow(['family', 'winner', 'shadowed'] + repos)
+    for record in records:
+        empty_folders = set(record['empty_folders'])
+        writer.writerow(
+            [record['family'], record['winner'] or '',
+             ';'.join(record['shadowed'])] +
+            [
+                record['versions'][repo] or
+                ('-' if repo in empty_folders else '')
+                for repo in repos
+            ]
+        )
+
+
+def write_report(stream, output_format='jsonl', max_workers=None):
+    """Stream the report of `packages_path` to `stream`.
+
+    Rows are written batch by batch as they are scanned, so the first ones
+    come out early. The memory used still grows with the number of packages:
+    the listings of the repositories and the packages loaded by rez are kept
+    for the whole run.
+    """
+    writer = {'jsonl': write_jsonl, 'csv': write_csv}[output_format]
+    repos = config.get('packages_path')
+    max_workers = max_workers or env_int(
+        'MANAGER_SCAN_WORKERS', scan.DEFAULT_SCAN_WORKERS
+    )
+    cache = open_scan_cache()
+    try:
+        writer(stream, repos, iter_records(repos, max_workers, cache))
+    finally:
+        if cache:
+            cache.close()
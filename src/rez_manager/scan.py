@@ -0,0 +1,495 @@
+"""Rez queries that feed the spreadsheet.
+
+Nothing in here touches Qt, so these functions are safe to call from a worker
+thread.
+"""
+import os
+import time
+import heapq
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from rez import packages
+from rez.package_repository import package_repository_manager
+
+
+logger = logging.getLogger(__name__)
+
+
+PACKAGE_FILES = ('package.py', 'package.yaml')
+
+DEFAULT_SCAN_WORKERS = 8
+
+# Number of families scanned between two updates of the spreadsheet
+BATCH_SIZE = 200
+
+# Number of slowest families kept by `RepoStats`
+SLOWEST_COUNT = 5
+
+
+class PackageRecord(object):
+    """What the spreadsheet shows of a package.
+
+    Unlike a rez package, a record can be restored from the scan cache without
+    loading the package definition. Use `package` to get the rez package.
+    """
+    __slots__ = (
+        'name', 'version', 'location', 'description', 'tools', 'variants',
+        'timestamp', '_package',
+    )
+
+    def __init__(
+        self, name, version, location, description=None, tools=(),
+        variants=(), timestamp=None, package=None,
+    ):
+        self.name = name
+        self.version = version
+        self.location = location
+        self.description = description
+        self.tools = list(tools or [])
+        self.variants = [list(variant) for variant in variants or []]
+        self.timestamp = timestamp
+        self._package = package
+
+    @classmethod
+    def from_package(cls, package, location):
+        """Copy what is shown of a rez package.
+
+        The record does not keep `package`, the `package` method loads it
+        again when needed.
+        """
+        # `package.variants` Example:
+        # [
+        #   [PackageRequest('python-2.7')],
+        #   [PackageRequest('python-3.7')],
+        # ]
+        return cls(
+            package.name, package.version, location,
+            description=package.description,
+            tools=package.tools,
+            variants=[
+                [request.safe_str() for request in variant]
+                for variant in package.variants or []
+            ],
+            timestamp=package.timestamp,
+        )
+
+    def metadata(self):
+        return dict(
+            description=self.description,
+            tools=self.tools,
+            variants=self.variants,
+            timestamp=self.timestamp,
+        )
+
+    def package(self):
+        """Return the rez package of this record."""
+        if self._package is None:
+            self._package = packages.get_package_from_repository(
+                self.name, self.version, self.location
+            )
+        return self._package
+
+
+class PackageCell(object):
+    """The state of one package family in one repository."""
+    __slots__ = ('latest', 'empty_folder')
+
+    def __init__(self, latest=None, empty_folder=None):
+        self.latest = latest
+        self.empty_folder = empty_folder
+
+
+# Shared by all the cells holding nothing, never modify it
+EMPTY_CELL = PackageCell()
+
+
+class RepoStats(object):
+    """Timings and counters of the scan of one repository.
+
+    A repository is only scanned by one thread at a time, so no lock is
+    needed.
+    """
+    __slots__ = (
+        'repo', 'families_listed', 'packages_loaded', 'cache_hits',
+        'listing_time', 'lookup_time', 'folder_listings', 'errors',
+        '_slowest',
+    )
+
+    def __init__(self, repo):
+        self.repo = repo
+        self.families_listed = 0
+        self.packages_loaded = 0
+        self.cache_hits = 0
+        self.listing_time = 0.0
+        self.lookup_time = 0.0
+        self.folder_listings = 0
+        self.errors = 0
+        self._slowest = []
+
+    def add_lookup(self, family_name, seconds):
+        self.lookup_time += seconds
+        if len(self._slowest) < SLOWEST_COUNT:
+            heapq.heappush(self._slowest, (seconds, family_name))
+        elif seconds > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, (seconds, family_name))
+
+    def slowest(self):
+        """Return `(family_name, seconds)` of the slowest families first."""
+        return [
+            (family_name, seconds)
+            for seconds, family_name in sorted(self._slowest, reverse=True)
+        ]
+
+    def snapshot(self):
+        """Return a copy of the stats, safe to hand to another thread."""
+        return dict(
+            repo=self.repo,
+            families_listed=self.families_listed,
+            packages_loaded=self.packages_loaded,
+            cache_hits=self.cache_hits,
+            listing_time=self.listing_time,
+            lookup_time=self.lookup_time,
+            folder_listings=self.folder_listings,
+            errors=self.errors,
+            slowest=self.slowest(),
+        )
+
+
+def family_sort_key(family_name):
+    """Sort families case insensitively, the way the spreadsheet lists them."""
+    return family_name.lower(), family_name
+
+
+def _latest_package(family):
+    latest = None
+    for package in family.iter_packages():
+        if latest is None or package.version > latest.version:
+            latest = package
+    return latest
+
+
+def _package_mtimes(repo, package):
+    folder = os.path.join(repo, package.name, str(package.version))
+    for filename in PACKAGE_FILES:
+        try:
+            file_mtime = os.stat(os.path.join(folder, filename)).st_mtime
+            break
+        except OSError:
+            continue
+    else:
+        return None
+    return os.stat(folder).st_mtime, file_mtime
+
+
+def load_record(repo, package, cache=None, stats=None):
+    """Make the `PackageRecord` of `package`, from `cache` if possible."""
+    mtimes = None
+    if cache is not None:
+        try:
+            mtimes = _package_mtimes(repo, package)
+        except OSError:
+            pass
+    if mtimes is None:
+        if stats is not None:
+            stats.packages_loaded += 1
+        return PackageRecord.from_package(package, repo)
+
+    version = str(package.version)
+    metadata = cache.get(repo, package.name, version, mtimes)
+    if metadata is not None:
+        if stats is not None:
+            stats.cache_hits += 1
+        return PackageRecord(
+            package.name, package.version, repo, **metadata
+        )
+
+    if stats is not None:
+        stats.packages_loaded += 1
+    record = PackageRecord.from_package(package, repo)
+    cache.put(repo, package.name, version, mtimes, record.metadata())
+    return record
+
+
+def _list_folders(repo):
+    try:
+        return set(
+            entry.name for entry in os.scandir(repo) if entry.is_dir()
+        )
+    except OSError:
+        return set()
+
+
+def list_repository(repo, stats=None):
+    """List the families of `repo` without reading their packages.
+
+    Returns:
+        tuple: `(families, folders)`. `families` maps family names to the rez
+            families found under that name, `folders` is the set of folder
+            names in `repo`.
+    """
+    start = time.perf_counter()
+    families = {}
+    for family in packages.iter_package_families(paths=[repo]):
+        families.setdefault(family.name, []).append(family)
+    folders = _list_folders(repo)
+
+    if stats is not None:
+        stats.listing_time += time.perf_counter() - start
+        stats.families_listed += len(families)
+        stats.folder_listings += 1
+    return families, folders
+
+
+def index_listing(
+    repo, listing, family_names, cache=None, cancelled=None, stats=None,
+):
+    """Index `family_names` out of the listing of `repo`.
+
+    Args:
+        repo (str): Repository path.
+        listing (tuple): What `list_repository` returned for `repo`.
+        family_names (list): Families to index, those not in `repo` are
+            skipped.
+        cache (ScanCache): Where to look up package metadata, optional.
+        cancelled (threading.Event): Stop at the next family once set, the
+            index is then incomplete.
+        stats (RepoStats): Where to record the time spent per family.
+
+    Returns:
+        dict: `{family_name: (latest_record, has_folder)}`. `latest_record`
+            is None if the family has no valid version in this repository.
+            A family failing to load, like with a broken package definition,
+            is logged and left out.
+    """
+    families, folders = listing
+    index = {}
+    for family_name in family_names:
+        if cancelled is not None and cancelled.is_set():
+            break
+        if family_name not in families:
+            continue
+
+        start = time.perf_counter()
+        try:
+            latest = None
+            for family in families[family_name]:
+                package = _latest_package(family)
+                if package and (
+                        not latest or package.version > latest.version):
+                    latest = package
+            if latest:
+                latest = load_record(repo, latest, cache, stats)
+        except Exception:
+            _log_family_error(repo, family_name, stats)
+            continue
+        index[family_name] = (latest, family_name in folders)
+        if stats is not None:
+            stats.add_lookup(family_name, time.perf_counter() - start)
+    return index
+
+
+def _log_family_error(repo, family_name, stats=None):
+    logger.exception(f'Failed to scan {family_name} in {repo}.')
+    if stats is not None:
+        stats.errors += 1
+
+
+def index_repository(repo, cache=None):
+    """Walk `repo` once and index all its families.
+
+    Returns:
+        dict: Same as `index_listing`.
+    """
+    listing = list_repository(repo)
+    return index_listing(repo, listing, listing[0], cache)
+
+
+def index_families(repo, family_names, cache=None):
+    """Index only `family_names` in `repo`.
+
+    Returns:
+        dict: Same as `index_listing`.
+    """
+    index = {}
+    for family_name in family_names:
+        has_folder = os.path.isdir(os.path.join(repo, family_name))
+        try:
+            latest = None
+            for package in packages.iter_packages(family_name, paths=[repo]):
+                if latest is None or package.version > latest.version:
+                    latest = package
+            if latest:
+                latest = load_record(repo, latest, cache)
+        except Exception:
+            _log_family_error(repo, family_name)
+            continue
+        if latest or has_folder:
+            index[family_name] = (latest, has_folder)
+    return index
+
+
+def make_cell(index, repo, family_name):
+    """Build the `PackageCell` of `family_name` out of a repository index."""
+    latest, has_folder = index.get(family_name, (None, False))
+    if latest:
+        return PackageCell(latest=latest)
+    if has_folder:
+        return PackageCell(empty_folder=os.path.join(repo, family_name))
+    return EMPTY_CELL
+
+
+def _list_repository_safely(repo, stats):
+    try:
+        return list_repository(repo, stats)
+    except Exception:
+        logger.exception(f'Failed to list {repo}.')
+        if stats is not None:
+            stats.errors += 1
+        return {}, set()
+
+
+def _index_listing_safely(
+    repo, listing, family_names, cache, cancelled, stats,
+):
+    try:
+        return index_listing(
+            repo, listing, family_names, cache, cancelled, stats
+        )
+    except Exception:
+        logger.exception(f'Failed to scan {repo}.')
+        if stats is not None:
+            stats.errors += 1
+        return {}
+
+
+def iter_row_batches(
+    repos, max_workers, cache=None, batch_size=BATCH_SIZE, cancelled=None,
+    stats=None,
+):
+    """Scan `repos` and yield the rows of the spreadsheet in batches.
+
+    The repositories are first listed, then their families are read batch by
+    batch. Every step runs the repositories concurrently on a bounded thread
+    pool.
+
+    Args:
+        repos (list): Repository paths.
+        max_workers (int): Maximum number of repositories scanned at once.
+        cache (ScanCache): Where to look up package metadata, optional.
+        batch_size (int): Number of families per batch.
+        cancelled (threading.Event): Stop at the next family once set. The
+            batch being read is dropped.
+        stats (list): One `RepoStats` per repository, filled as the scan
+            goes.
+
+    Yields:
+        tuple: `(rows, total)`. `rows` is a list of `(family_name, cells)`
+            sorted by family name, continuing the previous batch. `total` is
+            the number of families in all the batches.
+    """
+    stats = stats or [None] * len(repos)
+    package_repository_manager.clear_caches()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        listings = list(executor.map(_list_repository_safely, repos, stats))
+        family_names = sorted(
+            set().union(*(families for families, _ in listings)),
+            key=family_sort_key
+        )
+        total = len(family_names)
+
+        for start in range(0, total, batch_size):
+            batch = family_names[start:start + batch_size]
+            indexes = list(executor.map(
+                _index_listing_safely, repos, listings,
+                [batch] * len(repos), [cache] * len(repos),
+                [cancelled] * len(repos), stats,
+            ))
+            if cancelled is not None and cancelled.is_set():
+                return
+            yield [
+                (family_name, [
+                    make_cell(index, repo, family_name)
+                    for index, repo in zip(indexes, repos)
+                ])
+                for family_name in batch
+            ], total
+
+
+def scan_families(repos, family_names, cache=None):
+    """Rescan `family_names` in every repository.
+
+    Only the caches of rez are cleared, the families not listed are not read
+    again.
+
+    Returns:
+        dict: `{family_name: cells}` for every name in `family_names`. Families
+            gone from all the repositories get empty cells.
+    """
+    package_repository_manager.clear_caches()
+    indexes = [index_families(repo, family_names, cache) for repo in repos]
+    return {
+        family_name: [
+            make_cell(index, repo, family_name)
+            for index, repo in zip(indexes, repos)
+        ]
+        for family_name in family_names
+    }
+
+
+def scan_versions(repos, family_name, cache=None):
+    """List every version of `family_name` and the repositories holding it.
+
+    Returns:
+        list: `(version, cells)` from the newest version to the oldest, where
+            `cells` holds one `PackageCell` per repository in `repos`.
+            Versions failing to load are logged and skipped.
+    """
+    versions = {}
+    for irepo, repo in enumerate(repos):
+        try:
+            family_packages = list(
+                packages.iter_packages(family_name, paths=[repo])
+            )
+        except Exception:
+            _log_family_error(repo, family_name)
+            continue
+        for package in family_packages:
+            if package.version in versions and \
+                    versions[package.version][irepo] is not EMPTY_CELL:
+                continue
+            try:
+                record = load_record(repo, package, cache)
+            except Exception:
+                _log_family_error(repo, f'{family_name}-{package.version}')
+                continue
+            cells = versions.setdefault(
+                package.version, [EMPTY_CELL] * len(repos)
+            )
+            cells[irepo] = PackageCell(latest=record)
+    return sorted(versions.items(), key=lambda x: x[0], reverse=True)
+
+
+def find_winner(cells):
+    """Return the index of the cell whose package wins, or -1.
+
+    The winner is the first repository holding the highest version, which is
+    what rez would pick up.
+    """
+    versions = [cell.latest.version if cell.latest else None for cell in cells]
+    found = [version for version in versions if version]
+    if not found:
+        return -1
+    return versions.index(max(found))
+
+
+def scan_rows(repos, max_workers=1, cache=None):
+    """Scan `repos` and yield the rows of the spreadsheet one by one.
+
+    Yields:
+        tuple: `(family_name, cells)` sorted by family name, where `cells`
+            holds one `PackageCell` per repository in `repos`.
+    """
+    for rows, _ in iter_row_batches(repos, max_workers, cache):
+        for row in rows:
+            yield row
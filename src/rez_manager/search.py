@@ -0,0 +1,109 @@
+"""Index of family names for the as-you-type filter."""
+import bisect
+
+
+NGRAM_SIZE = 3
+
+
+def _ngrams(text):
+    return set(
+        text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)
+    )
+
+
+class FamilyNameIndex(object):
+    """Case insensitive substring search over family names.
+
+    Names are kept in a sorted list for prefix queries and in a trigram index
+    for substring queries, so a query only looks at the names sharing all its
+    trigrams.
+    """
+
+    def __init__(self, family_names=()):
+        self._sorted = []
+        self._names = {}
+        self._ngrams = {}
+        self._last_query = None
+        self._last_result = None
+        for family_name in family_names:
+            self.add(family_name)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, family_name):
+        return family_name in self._names
+
+    def add(self, family_name):
+        if family_name in self._names:
+            return
+        lowered = family_name.lower()
+        self._names[family_name] = lowered
+        bisect.insort(self._sorted, (lowered, family_name))
+        for ngram in _ngrams(lowered):
+            self._ngrams.setdefault(ngram, set()).add(family_name)
+        self._changed()
+
+    def discard(self, family_name):
+        lowered = self._names.pop(family_name, None)
+        if lowered is None:
+            return
+        i = bisect.bisect_left(self._sorted, (lowered, family_name))
+        del self._sorted[i]
+        for ngram in _ngrams(lowered):
+            names = self._ngrams[ngram]
+            names.discard(family_name)
+            if not names:
+                del self._ngrams[ngram]
+        self._changed()
+
+    def clear(self):
+        self._sorted = []
+        self._names = {}
+        self._ngrams = {}
+        self._changed()
+
+    def _changed(self):
+        self._last_query = None
+        self._last_result = None
+
+    def prefixed(self, prefix):
+        """Return the names starting with `prefix`, case insensitively."""
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self._sorted, (prefix,))
+        found = set()
+        for lowered, family_name in self._sorted[start:]:
+            if not lowered.startswith(prefix):
+                break
+            found.add(family_name)
+        return found
+
+    def search(self, query):
+        """Return the set of names containing `query`, case insensitively."""
+        query = query.lower()
+        if not query:
+            return set(self._names)
+
+        # Typing narrows the previous query, only its result can match
+        if self._last_query is not None and self._last_query in query:
+            candidates = self._last_result
+        elif len(query) < NGRAM_SIZE:
+            candidates = self._names
+        else:
+            sets = []
+            for ngram in _ngrams(query):
+                names = self._ngrams.get(ngram)
+                if not names:
+                    sets = [set()]
+                    break
+                sets.append(names)
+            sets.sort(key=len)
+            candidates = sets[0].intersection(*sets[1:])
+
+        result = set(
+            family_name for family_name in candidates
+            if query in self._names[family_name]
+        )
+        self._last_query = query
+        self._last_result = result
+        return result
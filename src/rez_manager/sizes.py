@@ -0,0 +1,120 @@
+"""Disk usage of the packages, walked with `os.scandir`."""
+import os
+import shutil
+
+
+def tree_size(folder):
+    """Return the bytes taken by the files under `folder`.
+
+    Symlinks are not followed, so a payload linked from another repository
+    costs nothing.
+    """
+    size = 0
+    folders = [folder]
+    while folders:
+        try:
+            entries = os.scandir(folders.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        folders.append(entry.path)
+                    else:
+                        size += entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    pass
+    return size
+
+
+def version_size(folder, cache=None):
+    """Return the size of a version folder, cached by its modification time.
+
+    The time of a folder only changes with its direct entries. Released
+    packages are not modified in place, so it is enough to notice a version
+    installed again.
+
+    Args:
+        folder (str): The version folder.
+        cache (ScanCache): Where to look up and store the size, optional.
+    """
+    mtime = os.stat(folder).st_mtime
+    if cache is not None:
+        size = cache.get_size(folder, mtime)
+        if size is not None:
+            return size
+
+    size = tree_size(folder)
+    if cache is not None:
+        cache.put_size(folder, mtime, size)
+    return size
+
+
+def family_sizes(repo, family_name, version=None, cache=None):
+    """Return the size of a version of a family and of all its versions.
+
+    Returns:
+        tuple: `(version_size, all_size)`, `version_size` is None if the
+            family has no such version in `repo`.
+    """
+    latest = None
+    total = 0
+    try:
+        entries = list(os.scandir(os.path.join(repo, family_name)))
+    except OSError:
+        return latest, total
+
+    for entry in entries:
+        if entry.name.startswith('.') or not entry.is_dir():
+            continue
+        try:
+            size = version_size(entry.path, cache)
+        except OSError:
+            continue
+        total += size
+        if entry.name == version:
+            latest = size
+    return latest, total
+
+
+def _existing_folder(path):
+    path = os.path.abspath(path)
+    while not os.path.exists(path) and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+    return path
+
+
+def free_space(path):
+    """Return the bytes available to the folder `path`, created or not."""
+    return shutil.disk_usage(_existing_folder(path)).free
+
+
+def same_device(path, other):
+    """Whether the folders `path` and `other`, created or not, share a device.
+    """
+    try:
+        return os.stat(_existing_folder(path)).st_dev == \
+            os.stat(_existing_folder(other)).st_dev
+    except OSError:
+        return False
+
+
+def packages_size(packages, cache=None):
+    """Return the bytes taken by the version folders of `packages`.
+
+    Args:
+        packages (list[PackageRecord]): The packages to add up, those
+            missing on disk count for nothing.
+        cache (ScanCache): Where to look up and store the sizes, optional.
+    """
+    size = 0
+    for package in packages:
+        folder = os.path.join(
+            package.location, package.name, str(package.version)
+        )
+        try:
+            size += version_size(folder, cache)
+        except OSError:
+            pass
+    return size
@@ -2,8 +2,17 @@ import logging
 import re
 import html
 import bisect
+from collections import deque
 
-from Qt import QtCore
+from Qt import QtCore, QtGui
+
+from .utils import env_int
+
+
+DEFAULT_MAX_BLOCKS = 10000
+
+# Milliseconds between two appends of the buffered messages
+FLUSH_INTERVAL = 100
 
 
 def log_color(level, dark_text=True):
@@ -16,30 +25,101 @@ def log_color(level, dark_text=True):
     return COLORS[index]
 
 
-class TextEditHandler(logging.Handler):
-    """Messages are guaranteed to be appended in main GUI thread."""
+class BufferedHandler(logging.Handler):
+    """Hand the records over in the GUI thread, whatever thread logs them.
 
-    # TODO: avoid dead textedit?
-    HTML_RE = re.compile('<.+>')
+    Records are buffered and handed to `add_items` in batches every
+    `FLUSH_INTERVAL` milliseconds. Subclasses turn a record into what they
+    buffer with `make_item`.
+    """
 
     class Sender(QtCore.QObject):
         """Transition class."""
-        _append = QtCore.Signal(str)
+        _schedule = QtCore.Signal()
 
-    def __init__(self, textedit, level=logging.DEBUG, dark_text=True):
-        super(TextEditHandler, self).__init__(level)
+    def __init__(self, parent, max_pending, level=logging.DEBUG):
+        super(BufferedHandler, self).__init__(level)
+        # Older records would be dropped by the view anyway
+        self._pending = deque(maxlen=max_pending)
+        self._scheduled = False
+
+        self._timer = QtCore.QTimer(parent)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(FLUSH_INTERVAL)
+        self._timer.timeout.connect(self.flush_records)
+        self._sender = BufferedHandler.Sender()
+        self._sender._schedule.connect(self._timer.start)
+
+    def make_item(self, record):
+        raise NotImplementedError
+
+    def add_items(self, items):
+        raise NotImplementedError
+
+    def emit(self, record):
+        item = self.make_item(record)
+        # `handle` holds the lock of the handler
+        self._pending.append(item)
+        if not self._scheduled:
+            self._scheduled = True
+            self._sender._schedule.emit()
+
+    def flush_records(self):
+        """Add the buffered records, in the GUI thread only."""
+        self.acquire()
+        try:
+            items = list(self._pending)
+            self._pending.clear()
+            self._scheduled = False
+        finally:
+            self.release()
+        if items:
+            self.add_items(items)
+
+
+class TextEditHandler(BufferedHandler):
+    """Messages are guaranteed to be appended in main GUI thread.
+
+    The text edit keeps the last `max_blocks` messages.
+    """
+
+    # TODO: avoid dead textedit?
+    HTML_RE = re.compile('<.+>')
+
+    def __init__(
+            self, textedit, level=logging.DEBUG, dark_text=True,
+            max_blocks=None,
+    ):
+        if max_blocks is None:
+            max_blocks = env_int(
+                'MANAGER_LOG_MAX_ENTRIES', DEFAULT_MAX_BLOCKS
+            )
+        super(TextEditHandler, self).__init__(textedit, max_blocks, level)
         self._textedit = textedit
-        self._sender = TextEditHandler.Sender()
-        self._sender._append.connect(self._textedit.append)
+        self._textedit.document().setMaximumBlockCount(max_blocks)
         self.dark_text = dark_text
 
-    def emit(self, record):
+    def make_item(self, record):
         msg = self.format(record)
         is_html = self.HTML_RE.search(msg)
         if not is_html:
             msg = html.escape(msg)
-        formatted = u'<span style="color:{}">{}</span>'.format(
+        return u'<span style="color:{}">{}</span>'.format(
             log_color(record.levelno, dark_text=self.dark_text),
             msg.replace('\n', '<br>')
         )
-        self._sender._append.emit(formatted)
+
+    def add_items(self, messages):
+        scrollbar = self._textedit.verticalScrollBar()
+        at_bottom = scrollbar.value() == scrollbar.maximum()
+        document = self._textedit.document()
+        cursor = QtGui.QTextCursor(document)
+        cursor.movePosition(QtGui.QTextCursor.End)
+        cursor.beginEditBlock()
+        for i, message in enumerate(messages):
+            if i or not document.isEmpty():
+                cursor.insertBlock()
+            cursor.insertHtml(message)
+        cursor.endEditBlock()
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
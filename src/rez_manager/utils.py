@@ -1,4 +1,6 @@
+import os
 import logging
+from collections import OrderedDict
 
 
 def catch_exception(fn):
@@ -15,3 +17,95 @@ def catch_exception(fn):
             logger.exception('Exception encountered.')
 
     return _wrapper
+
+
+def env_int(name, default):
+    """Read an integer setting from the environment.
+
+    Args:
+        name (str): Name of the environment variable.
+        default (int): Value used if the variable is unset or invalid.
+    """
+    try:
+        return int(os.environ[name])
+    except (KeyError, ValueError):
+        return default
+
+
+def format_size(size):
+    """Return a number of bytes as a short human readable string."""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            break
+        size /= 1024
+    else:
+        unit = 'TB'
+    return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+
+
+class LRUCache(object):
+    """A dict-like cache keeping the `maxsize` most recently used entries."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return default
+        return self._data[key]
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+    def pop(self, key, default=None):
+        return self._data.pop(key, default)
+
+    def clear(self):
+        self._data.clear()
+
+
+class RingBuffer(object):
+    """A list keeping its last `maxlen` items, indexed in constant time."""
+
+    def __init__(self, maxlen):
+        self.maxlen = maxlen
+        self._items = [None] * maxlen
+        self._start = 0
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, i):
+        if not 0 <= i < self._length:
+            raise IndexError(i)
+        return self._items[(self._start + i) % self.maxlen]
+
+    def append(self, item):
+        """Append `item`, dropping the oldest item if the buffer is full."""
+        if self._length < self.maxlen:
+            self._items[(self._start + self._length) % self.maxlen] = item
+            self._length += 1
+        else:
+            self._items[self._start] = item
+            self._start = (self._start + 1) % self.maxlen
+
+    def drop(self, count):
+        """Drop the `count` oldest items."""
+        count = min(count, self._length)
+        for i in range(count):
+            self._items[(self._start + i) % self.maxlen] = None
+        self._start = (self._start + count) % self.maxlen
+        self._length -= count
+
+    def clear(self):
+        self.drop(self._length)
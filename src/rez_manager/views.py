@@ -1,14 +1,31 @@
 import os
-import shutil
+import time
 import logging
 from functools import partial
 
-import qtawesome as qta
-from Qt import QtWidgets, QtCore
+from Qt import QtWidgets, QtCore, QtGui
 from rez.config import config
-from rez.package_copy import copy_package
 
-from .utils import catch_exception
+from .utils import catch_exception, env_int, format_size
+from .workers import (
+    LocaliseWorker, DeleteWorker, DeleteFoldersWorker, PurgeWorker
+)
+from .operations import localise_mode, restore
+
+
+DEFAULT_LOCALISE_WORKERS = 4
+DEFAULT_DELETE_WORKERS = 4
+# Seconds a delete can be undone, its folders are purged after that
+DEFAULT_UNDO_DELAY = 300
+# Milliseconds between two purges of the quarantine folder
+PURGE_INTERVAL = 60 * 1000
+
+
+def icon(name):
+    """Return a qtawesome icon, loading qtawesome and its fonts on first use.
+    """
+    import qtawesome as qta
+    return qta.icon(name)
 
 
 def get_local_repo_index():
@@ -19,40 +36,30 @@ def get_local_repo_index():
     return -1
 
 
-def format_list(list_of_str):
-    return '\n'.join(' - ' + line for line in list_of_str)
-
-
-def delete_local(packages, all_version: bool):
-    folders_deleted = []
-    for package in packages:
-        package_dir = os.path.join(package.resource.location, package.name)
-
-        if all_version:
-            to_delete = package_dir
-        else:
-            children = os.listdir(package_dir)
-
-            # Remove package folder instead of version folder to avoid leaving
-            # empty folder
-            if len(children) == 1:
-                assert children[0] == str(package.version)
-                to_delete = package_dir
-            else:
-                to_delete = os.path.join(package_dir, str(package.version))
-        shutil.rmtree(to_delete)
-        folders_deleted.append(to_delete)
-    return folders_deleted
-
-
 class SpreadsheetView(QtWidgets.QTreeView):
-    packagesChanged = QtCore.Signal()
+    # Names of the package families changed on disk
+    packagesChanged = QtCore.Signal(list)
+    # Label, number of packages done, number of packages in total
+    jobProgress = QtCore.Signal(str, int, int)
+    jobEnded = QtCore.Signal()
 
     def __init__(self, parent=None):
         super(SpreadsheetView, self).__init__(parent)
         self.setSelectionBehavior(self.SelectItems)
         self.setSelectionMode(self.ExtendedSelection)
         self.logger = logging.getLogger(__name__)
+        self._job = None
+        self._job_label = ''
+        self._job_progress = (0, 0)
+        self._job_failures = 0
+        # `(family_name, quarantine_entry)` of the last delete
+        self._undo_entries = []
+        self._undo_deadline = 0
+        self._purge_worker = None
+
+        self._purge_timer = QtCore.QTimer(self)
+        self._purge_timer.setInterval(PURGE_INTERVAL)
+        self._purge_timer.timeout.connect(self.purge_deleted)
 
     def contextMenuEvent(self, event):
         indexes = self.selectionModel().selectedIndexes()
@@ -65,14 +72,30 @@ class SpreadsheetView(QtWidgets.QTreeView):
         self._add_multiple_packages_menu(menu, indexes)
         self._add_one_package_menu(menu, indexes)
 
-        menu.addAction(qta.icon('fa.refresh'), 'Update', model.reload)
+        menu.addAction(icon('fa.refresh'), 'Update', model.reload)
+        if self.can_undo_delete():
+            menu.addAction(
+                icon('fa.undo'), 'Undo Last Delete', self.undo_delete
+            )
+        if model.is_cooking():
+            menu.addAction(
+                icon('fa.stop'), 'Cancel Update', model.cancel_reload
+            )
+        watch_action = menu.addAction('Watch Local Repository')
+        watch_action.setCheckable(True)
+        watch_action.setChecked(model.is_watching())
+        watch_action.toggled.connect(model.set_watching)
+        sizes_action = menu.addAction('Show Sizes')
+        sizes_action.setCheckable(True)
+        sizes_action.setChecked(model.is_showing_sizes())
+        sizes_action.toggled.connect(model.set_showing_sizes)
         menu.exec(event.globalPos())
 
     def _add_one_package_menu(self, menu, indexes):
         if len(indexes) == 1 and indexes[0].column() != 0 and \
-                self.model().itemFromIndex(indexes[0]).text():
+                indexes[0].data():
             menu.addAction(
-                qta.icon('fa.folder'),
+                icon('fa.folder'),
                 'Open Folder',
                 partial(self.open_folder, indexes[0])
             )
@@ -84,12 +107,12 @@ class SpreadsheetView(QtWidgets.QTreeView):
         empty_package_folders = []
 
         for index in indexes:
-            item = model.itemFromIndex(index)
-            if index.column() == local_repo_table_index:
-                if item.latest:
-                    to_delete.append(item.latest)
-                elif item.empty_folder:
-                    empty_package_folders.append(item.empty_folder)
+            cell = model.cell(index)
+            if cell and index.column() == local_repo_table_index:
+                if cell.latest:
+                    to_delete.append(cell.latest)
+                elif cell.empty_folder:
+                    empty_package_folders.append(cell.empty_folder)
 
         actions = []
         if to_delete:
@@ -116,20 +139,27 @@ class SpreadsheetView(QtWidgets.QTreeView):
         to_localise = []
 
         for index in indexes:
-            item = model.itemFromIndex(index)
-            version = item.text()
-
             if index.column() not in [0, local_repo_table_index]:
-                if version:
-                    to_localise.append(item.latest)
+                cell = model.cell(index)
+                if cell.latest:
+                    to_localise.append(cell.latest)
 
         actions = []
         if to_localise:
             actions.append(menu.addAction(
-                qta.icon('fa.cloud-download'),
+                icon('fa.cloud-download'),
                 'Localise',
                 partial(self.localise, to_localise)
             ))
+        if any(package.variants for package in to_localise):
+            actions.append(menu.addAction(
+                'Localise (Matching Variants)',
+                partial(self.localise, to_localise, matching=True)
+            ))
+            actions.append(menu.addAction(
+                'Localise (Missing Variants)',
+                partial(self.localise, to_localise, missing=True)
+            ))
 
         return actions
 
@@ -151,38 +181,214 @@ class SpreadsheetView(QtWidgets.QTreeView):
         if actions:
             menu.addSeparator()
 
+    def _delete(self, worker, on_package_done):
+        worker.removed.connect(self._on_removed)
+        if self._start_job(worker, 'Deleting', on_package_done):
+            self.logger.info(f'Deleting {len(worker.packages)} folder(s)..')
+            self._undo_entries = []
+            self._undo_deadline = time.time() + self._undo_delay()
+
     @catch_exception
     def on_delete_local(self, packages, all_version):
-        self.logger.info('Deleting..')
-        folders_deleted = delete_local(packages, all_version)
-        self.packagesChanged.emit()
-        self.logger.info('Folder(s) deleted:\n' + format_list(folders_deleted))
+        self._delete(
+            DeleteWorker(
+                packages, config.get('local_packages_path'),
+                self._delete_workers(), all_version,
+            ),
+            self._on_package_deleted,
+        )
 
     @catch_exception
     def delete_empty_folder(self, folders):
-        self.logger.info('Deleting..')
-        for folder in folders:
-            shutil.rmtree(folder)
-        self.logger.info('Folder(s) deleted:\n' + format_list(folders))
-        self.packagesChanged.emit()
+        self._delete(
+            DeleteFoldersWorker(
+                folders, config.get('local_packages_path'),
+                self._delete_workers(),
+            ),
+            self._on_folder_deleted,
+        )
+
+    def _delete_workers(self):
+        return env_int('MANAGER_DELETE_WORKERS', DEFAULT_DELETE_WORKERS)
+
+    def _undo_delay(self):
+        return env_int('MANAGER_UNDO_DELETE_DELAY', DEFAULT_UNDO_DELAY)
+
+    def can_undo_delete(self):
+        return bool(self._undo_entries) and \
+            time.time() < self._undo_deadline and not self.is_busy()
+
+    @catch_exception
+    def undo_delete(self):
+        """Restore the folders of the last delete from the quarantine."""
+        entries, self._undo_entries = self._undo_entries, []
+        for family_name, entry in entries:
+            try:
+                folder = restore(entry)
+            except OSError as e:
+                self.logger.error(f'Failed to restore {family_name}: {e}')
+                continue
+            self.logger.info(f'{folder} restored.')
+        self.packagesChanged.emit(
+            sorted(set(family_name for family_name, _ in entries))
+        )
+
+    def start_purging(self):
+        """Purge the old deleted folders now and then from now on."""
+        self.purge_deleted()
+        self._purge_timer.start()
+
+    def stop_purging(self):
+        self._purge_timer.stop()
+        if self._purge_worker:
+            self._purge_worker.cancel()
+            self._purge_worker.wait()
+            self._purge_worker = None
+
+    def purge_deleted(self):
+        """Delete for good the folders which can not be restored anymore."""
+        if self._purge_worker:
+            return
+        local_repo = config.get('local_packages_path')
+        if not local_repo:
+            return
+        self._purge_worker = PurgeWorker(local_repo, self._undo_delay())
+        self._purge_worker.finished.connect(self._on_purge_finished)
+        self._purge_worker.start()
+
+    def _on_purge_finished(self):
+        if self._purge_worker:
+            self._purge_worker.wait()
+            self._purge_worker = None
+
+    def _on_removed(self, files, size):
+        self._job_label = f'Deleting, {files} files, {format_size(size)},'
+        self.jobProgress.emit(self._job_label, *self._job_progress)
+
+    def _on_package_deleted(self, package, error):
+        label = package.name if self._job.all_version else \
+            f'{package.name}-{package.version}'
+        self._on_deleted(package, package.name, label, error)
+
+    def _on_folder_deleted(self, folder, error):
+        self._on_deleted(folder, os.path.basename(folder), folder, error)
+
+    def _on_deleted(self, package, family_name, label, error):
+        if error:
+            self._job_failures += 1
+            self.logger.error(f'Failed to delete {label}: {error}')
+            return
+        entry = self._job.entries.get(package)
+        if entry:
+            self._undo_entries.append((family_name, entry))
+        self.logger.info(f'{label} deleted.')
+        self.packagesChanged.emit([family_name])
 
     @catch_exception
     def open_folder(self, index):
-        item = self.model().itemFromIndex(index)
-        if not item.latest:
+        latest = self.model().cell(index).latest
+        if not latest:
             return
         folder = os.path.join(
-            item.latest.resource.location,
-            item.latest.name,
-            str(item.latest.version),
+            latest.location, latest.name, str(latest.version)
         )
         os.startfile(folder)
 
+    def is_busy(self):
+        """Whether a job changing the packages on disk is running."""
+        return self._job is not None
+
+    def _start_job(self, worker, label, on_package_done):
+        if self.is_busy():
+            self.logger.warning('Please wait for the running job to end.')
+            return False
+
+        self._job = worker
+        self._job_label = label
+        self._job_progress = (0, len(worker.packages))
+        self._job_failures = 0
+        worker.progress.connect(self._on_job_progress)
+        worker.packageDone.connect(on_package_done)
+        worker.finished.connect(self._on_job_finished)
+        self.jobProgress.emit(label, *self._job_progress)
+        worker.start()
+        return True
+
+    def cancel_job(self):
+        """Skip the packages the running job has not started yet."""
+        if self._job and not self._job.is_cancelled():
+            self.logger.info('Cancelling..')
+            self._job.cancel()
+
+    def wait_job(self):
+        if self._job:
+            self._job.wait()
+
+    def _on_job_progress(self, done, total):
+        self._job_progress = (done, total)
+        self.jobProgress.emit(self._job_label, done, total)
+
+    def _on_job_finished(self):
+        self._job.wait()
+        cancelled = self._job.is_cancelled()
+        self._job = None
+        if cancelled:
+            self.logger.warning('Job cancelled.')
+        if self._job_failures:
+            self.logger.error(f'{self._job_failures} package(s) failed.')
+        self.jobEnded.emit()
+
     @catch_exception
-    def localise(self, packages):
+    def localise(self, packages, matching=False, missing=False):
         local_repo = config.get('local_packages_path')
-        self.logger.info('Localising..')
-        for package in packages:
-            copy_package(package, local_repo, keep_timestamp=True)
-        self.logger.info(f'{len(packages)} packages localised.')
-        self.packagesChanged.emit()
+        worker = LocaliseWorker(
+            packages, local_repo,
+            env_int('MANAGER_LOCALISE_WORKERS', DEFAULT_LOCALISE_WORKERS),
+            matching=matching, missing=missing, mode=localise_mode(),
+        )
+        if self._start_job(worker, 'Localising', self._on_localised):
+            self.logger.info(f'Localising {len(packages)} package(s)..')
+
+    def _on_localised(self, package, error):
+        label = f'{package.name}-{package.version}'
+        if error:
+            self._job_failures += 1
+            self.logger.error(f'Failed to localise {label}: {error}')
+            return
+        self.logger.info(f'{label} localised.')
+        self.packagesChanged.emit([package.name])
+
+
+class RepoStatsView(QtWidgets.QTableWidget):
+    """Show the timings and counters of the scan, one row per repository."""
+    COLUMNS = [
+        ('Repository', lambda stats: stats['repo']),
+        ('Families', lambda stats: str(stats['families_listed'])),
+        ('Loaded', lambda stats: str(stats['packages_loaded'])),
+        ('Cached', lambda stats: str(stats['cache_hits'])),
+        ('Listing', lambda stats: f"{stats['listing_time']:.2f}s"),
+        ('Lookups', lambda stats: f"{stats['lookup_time']:.2f}s"),
+        ('Folder Listings', lambda stats: str(stats['folder_listings'])),
+        ('Errors', lambda stats: str(stats['errors'])),
+        ('Slowest', lambda stats: ', '.join(
+            f'{family_name} ({seconds:.2f}s)'
+            for family_name, seconds in stats['slowest']
+        )),
+    ]
+
+    def __init__(self, parent=None):
+        super(RepoStatsView, self).__init__(0, len(self.COLUMNS), parent)
+        self.setHorizontalHeaderLabels([name for name, _ in self.COLUMNS])
+        self.setEditTriggers(self.NoEditTriggers)
+        self.verticalHeader().hide()
+
+    def set_stats(self, stats):
+        """Show a list of `RepoStats.snapshot`."""
+        self.setRowCount(len(stats))
+        for row, repo_stats in enumerate(stats):
+            for column, (_, text) in enumerate(self.COLUMNS):
+                item = QtWidgets.QTableWidgetItem(text(repo_stats))
+                if column == 7 and repo_stats['errors']:
+                    item.setForeground(QtGui.QColor('red'))
+                self.setItem(row, column, item)
+        self.resizeColumnsToContents()
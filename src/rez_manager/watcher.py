@@ -0,0 +1,89 @@
+import os
+import logging
+
+from Qt import QtCore
+
+
+# Milliseconds without new events before the changes are reported
+DEBOUNCE_DELAY = 500
+
+
+def _list_folders(path):
+    try:
+        return set(
+            entry.name for entry in os.scandir(path)
+            if entry.is_dir() and not entry.name.startswith('.')
+        )
+    except OSError:
+        return set()
+
+
+class RepositoryWatcher(QtCore.QObject):
+    """Watch a repository folder and its family folders.
+
+    Bursts of file system events are collected and reported once as the names
+    of the families that changed.
+    """
+    familiesChanged = QtCore.Signal(list)
+
+    def __init__(self, repo, parent=None):
+        super(RepositoryWatcher, self).__init__(parent)
+        self.repo = os.path.normpath(repo)
+        self.logger = logging.getLogger(__name__)
+
+        self._families = set()
+        self._changed = set()
+        self._repo_changed = False
+
+        self._watcher = QtCore.QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._on_directory_changed)
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(DEBOUNCE_DELAY)
+        self._timer.timeout.connect(self._flush)
+
+    def start(self):
+        if not os.path.isdir(self.repo):
+            self.logger.warning(f'Can not watch missing folder {self.repo}.')
+            return
+        self._families = _list_folders(self.repo)
+        self._watcher.addPath(self.repo)
+        self._watch_families(self._families)
+        self.logger.info(f'Watching {self.repo}.')
+
+    def stop(self):
+        self._timer.stop()
+        paths = self._watcher.directories()
+        if paths:
+            self._watcher.removePaths(paths)
+        self._families = set()
+        self._changed.clear()
+
+    def _watch_families(self, family_names):
+        paths = [os.path.join(self.repo, name) for name in family_names]
+        if paths:
+            self._watcher.addPaths(paths)
+
+    def _on_directory_changed(self, path):
+        path = os.path.normpath(path)
+        if path == self.repo:
+            self._repo_changed = True
+        else:
+            self._changed.add(os.path.basename(path))
+        self._timer.start()
+
+    def _flush(self):
+        if self._repo_changed:
+            self._repo_changed = False
+            families = _list_folders(self.repo)
+            added = families - self._families
+            self._changed.update(added)
+            self._changed.update(self._families - families)
+            self._families = families
+            self._watch_families(added)
+
+        if self._changed:
+            changed = sorted(self._changed)
+            self._changed.clear()
+            self.familiesChanged.emit(changed)
@@ -2,16 +2,17 @@ import os
 import logging
 from functools import partial
 
-from Qt import QtWidgets, QtGui
+from Qt import QtWidgets, QtGui, QtCore
 
 from .models import RezPackagesModel
-from .views import SpreadsheetView
-from .textedithandler import TextEditHandler
+from .views import RepoStatsView, SpreadsheetView
+from .logview import LogModelHandler, LogView
+from .utils import env_int
 
 
-def _setup_logger(textedit):
+def _setup_logger(log_view):
     logger = logging.getLogger('rez_manager')
-    log_handler = TextEditHandler(textedit)
+    log_handler = LogModelHandler(log_view.model)
     log_handler.setLevel(logging.DEBUG)
     logger.addHandler(log_handler)
     logger.setLevel(logging.DEBUG)
@@ -25,25 +26,86 @@ class ManagerWin(QtWidgets.QMainWindow):
 
         self.setup_window()
 
+        self.filter_edit = QtWidgets.QLineEdit()
+        self.filter_edit.setPlaceholderText(
+            'Filter packages, start with ^ to match the beginning..'
+        )
+        self.filter_edit.setClearButtonEnabled(True)
+        self.centralWidget().layout().addWidget(self.filter_edit)
+
         self.splitter = QtWidgets.QSplitter(self.centralWidget())
         self.centralWidget().layout().addWidget(self.splitter)
 
         self.spreadsheet = self.setup_spreadsheet()
         self.splitter.addWidget(self.spreadsheet)
 
-        self.log_widget = QtWidgets.QTextEdit()
+        self.log_widget = LogView()
         self.splitter.addWidget(self.log_widget)
         self.splitter.setSizes([800, 400])
 
+        self.stats_view = RepoStatsView()
+        self.stats_dock = QtWidgets.QDockWidget('Repository Scan')
+        self.stats_dock.setObjectName('stats_dock')
+        self.stats_dock.setWidget(self.stats_view)
+        self.addDockWidget(QtCore.Qt.BottomDockWidgetArea, self.stats_dock)
+
         self.logger = _setup_logger(self.log_widget)
 
         self._connect()
+
+    def start(self):
+        """Start scanning, call it once the window is shown."""
+        self.spreadsheet.model().set_watching(
+            bool(env_int('MANAGER_WATCH_LOCAL', 0))
+        )
         self.spreadsheet.model().reload()
+        self.spreadsheet.start_purging()
 
     def _connect(self):
-        self.spreadsheet.packagesChanged.connect(
-            self.spreadsheet.model().reload
-        )
+        model = self.spreadsheet.model()
+        self.filter_edit.textChanged.connect(model.set_filter_text)
+        self.spreadsheet.packagesChanged.connect(model.refresh_families)
+        model.cookingStarted.connect(self.on_cooking_started)
+        model.cookingEnded.connect(self.on_cooking_ended)
+        model.scanProgress.connect(self.on_scan_progress)
+        self.cancel_button.clicked.connect(model.cancel_reload)
+        self.spreadsheet.jobProgress.connect(self.on_job_progress)
+        self.spreadsheet.jobEnded.connect(self.on_job_ended)
+        self.job_cancel_button.clicked.connect(self.spreadsheet.cancel_job)
+        model.repoStatsChanged.connect(self.stats_view.set_stats)
+
+    def on_cooking_started(self):
+        self.statusBar().showMessage('Scanning repositories..')
+        self.cancel_button.show()
+
+    def on_cooking_ended(self):
+        self.cancel_button.hide()
+        self.progress_label.clear()
+        self.show_status_message('Scan finished.')
+
+    def on_scan_progress(self, done, total):
+        self.progress_label.setText(f'{done} of {total} families')
+
+    def on_job_progress(self, label, done, total):
+        self.job_progress.setMaximum(total)
+        self.job_progress.setValue(done)
+        self.job_progress.setFormat(f'{label} %v/%m')
+        self.job_progress.show()
+        self.job_cancel_button.show()
+
+    def on_job_ended(self):
+        self.job_progress.hide()
+        self.job_cancel_button.hide()
+        self.show_status_message('Done.')
+
+    def closeEvent(self, event):
+        self.spreadsheet.cancel_job()
+        self.spreadsheet.wait_job()
+        self.spreadsheet.stop_purging()
+        self.spreadsheet.model().cancel_reload()
+        self.spreadsheet.model().set_watching(False)
+        self.spreadsheet.model().wait()
+        super(ManagerWin, self).closeEvent(event)
 
     def setup_window(self):
         """Do the general ui setup work."""
@@ -55,6 +117,17 @@ class ManagerWin(QtWidgets.QMainWindow):
         # Statusbar
         statusbar = QtWidgets.QStatusBar()
         self.setStatusBar(statusbar)
+        self.progress_label = QtWidgets.QLabel()
+        statusbar.addPermanentWidget(self.progress_label)
+        self.cancel_button = QtWidgets.QPushButton('Cancel')
+        self.cancel_button.hide()
+        statusbar.addPermanentWidget(self.cancel_button)
+        self.job_progress = QtWidgets.QProgressBar()
+        self.job_progress.hide()
+        statusbar.addPermanentWidget(self.job_progress)
+        self.job_cancel_button = QtWidgets.QPushButton('Cancel')
+        self.job_cancel_button.hide()
+        statusbar.addPermanentWidget(self.job_cancel_button)
 
         # Appearance
         version = os.environ['REZ_REZ_MANAGER_VERSION']
@@ -70,8 +143,7 @@ class ManagerWin(QtWidgets.QMainWindow):
     def setup_spreadsheet(self):
         view = SpreadsheetView()
         model = RezPackagesModel()
-        # proxy_model = RezPackagesProxyModel()
-        # proxy_model.setSourceModel(model)
-        # view.setModel(proxy_model)
         view.setModel(model)
+        view.header().setSortIndicator(0, QtCore.Qt.AscendingOrder)
+        view.setSortingEnabled(True)
         return view
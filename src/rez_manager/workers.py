@@ -0,0 +1,350 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from Qt import QtCore
+
+from . import scan, operations, sizes
+from .cache import open_scan_cache
+from .utils import format_size
+
+
+# Sizes handed back at once by `SizesWorker`
+SIZES_BATCH_SIZE = 50
+
+
+class Worker(QtCore.QObject):
+    """Runs `work` in a dedicated thread.
+
+    Results must be handed back through signals. Receivers living in the GUI
+    thread get them queued, so they never touch Qt objects from the worker.
+    """
+    finished = QtCore.Signal()
+
+    def __init__(self):
+        super(Worker, self).__init__()
+        self.logger = logging.getLogger(__name__)
+        self.cancelled = threading.Event()
+        self._thread = QtCore.QThread()
+        self.moveToThread(self._thread)
+        self._thread.started.connect(self.run)
+
+    def start(self):
+        self._thread.start()
+
+    def cancel(self):
+        """Ask `work` to stop as soon as it can."""
+        self.cancelled.set()
+
+    def is_cancelled(self):
+        return self.cancelled.is_set()
+
+    def wait(self):
+        """Block until the thread has finished."""
+        self._thread.quit()
+        self._thread.wait()
+
+    def is_running(self):
+        return self._thread.isRunning()
+
+    @QtCore.Slot()
+    def run(self):
+        try:
+            self.work()
+        except Exception:
+            self.logger.exception('Exception encountered.')
+        finally:
+            self._thread.quit()
+            self.finished.emit()
+
+    def work(self):
+        raise NotImplementedError
+
+
+class ScanWorker(Worker):
+    """Scan the repositories, handing back the rows batch by batch."""
+    rowsScanned = QtCore.Signal(object)
+    progress = QtCore.Signal(int, int)
+    # A list of `RepoStats.snapshot`, one per repository
+    statsUpdated = QtCore.Signal(object)
+
+    def __init__(self, repos, max_workers):
+        super(ScanWorker, self).__init__()
+        self.repos = repos
+        self.max_workers = max_workers
+
+    def work(self):
+        cache = open_scan_cache()
+        stats = [scan.RepoStats(repo) for repo in self.repos]
+        done = 0
+        try:
+            for rows, total in scan.iter_row_batches(
+                self.repos, self.max_workers, cache,
+                cancelled=self.cancelled, stats=stats,
+            ):
+                done += len(rows)
+                self.rowsScanned.emit(rows)
+                self.progress.emit(done, total)
+                self.statsUpdated.emit(
+                    [repo_stats.snapshot() for repo_stats in stats]
+                )
+        finally:
+            if cache:
+                cache.close()
+            self.statsUpdated.emit(
+                [repo_stats.snapshot() for repo_stats in stats]
+            )
+
+
+class FamiliesWorker(Worker):
+    """Rescan a few package families."""
+    familiesScanned = QtCore.Signal(object)
+
+    def __init__(self, repos, family_names):
+        super(FamiliesWorker, self).__init__()
+        self.repos = repos
+        self.family_names = family_names
+
+    def work(self):
+        cache = open_scan_cache()
+        try:
+            self.familiesScanned.emit(
+                scan.scan_families(self.repos, self.family_names, cache)
+            )
+        finally:
+            if cache:
+                cache.close()
+
+
+class VersionsWorker(Worker):
+    """List all the versions of a package family."""
+    versionsScanned = QtCore.Signal(str, object)
+
+    def __init__(self, repos, family_name):
+        super(VersionsWorker, self).__init__()
+        self.repos = repos
+        self.family_name = family_name
+
+    def work(self):
+        cache = open_scan_cache()
+        try:
+            self.versionsScanned.emit(
+                self.family_name,
+                scan.scan_versions(self.repos, self.family_name, cache)
+            )
+        finally:
+            if cache:
+                cache.close()
+
+
+class PackagesWorker(Worker):
+    """Process packages concurrently on a bounded thread pool.
+
+    A failing package is reported and does not stop the others. Once
+    cancelled, the packages not started yet are skipped.
+    """
+    # The package, the error message or an empty string on success
+    packageDone = QtCore.Signal(object, str)
+    # Number of packages done, number of packages in total
+    progress = QtCore.Signal(int, int)
+
+    def __init__(self, packages, max_workers):
+        super(PackagesWorker, self).__init__()
+        self.packages = packages
+        self.max_workers = max_workers
+
+    def process(self, package):
+        raise NotImplementedError
+
+    def _process(self, package):
+        if self.is_cancelled():
+            return False
+        self.process(package)
+        return True
+
+    def work(self):
+        total = len(self.packages)
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as \
+                executor:
+            futures = {
+                executor.submit(self._process, package): package
+                for package in self.packages
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                package = futures[future]
+                try:
+                    processed = future.result()
+                    error = ''
+                except Exception as e:
+                    self.logger.debug('Failed.', exc_info=True)
+                    processed = True
+                    error = str(e) or e.__class__.__name__
+                if processed:
+                    self.packageDone.emit(package, error)
+                self.progress.emit(done, total)
+
+
+class LocaliseWorker(PackagesWorker):
+    """Copy packages to the local repository."""
+
+    def __init__(
+            self, packages, local_repo, max_workers, matching=False,
+            missing=False, mode='copy',
+    ):
+        super(LocaliseWorker, self).__init__(packages, max_workers)
+        self.local_repo = local_repo
+        self.matching = matching
+        self.missing = missing
+        self.mode = mode
+
+    def work(self):
+        if self.mode == 'symlink' or self._has_space():
+            super(LocaliseWorker, self).work()
+
+    def _has_space(self):
+        """Whether the packages fit in the free space of the local repo."""
+        packages = self.packages
+        if self.mode == 'link':
+            # Files are only cloned or hardlinked on the same device, the
+            # others are copied
+            packages = [
+                package for package in packages
+                if not sizes.same_device(package.location, self.local_repo)
+            ]
+        cache = open_scan_cache()
+        try:
+            needed = sizes.packages_size(packages, cache)
+        finally:
+            if cache:
+                cache.close()
+        free = sizes.free_space(self.local_repo)
+        if needed <= free:
+            return True
+
+        message = (
+            f'Localising needs about {format_size(needed)}, '
+            f'{format_size(free)} free in {self.local_repo}.'
+        )
+        if self.matching or self.missing:
+            # Only some variants are copied, the estimate is too big
+            self.logger.warning(message)
+            return True
+        self.logger.error(message)
+        return False
+
+    def process(self, package):
+        operations.localise_package(
+            package, self.local_repo, self.matching, self.missing, self.mode
+        )
+
+
+class DeleteWorker(PackagesWorker):
+    """Delete local packages by moving them into the quarantine folder.
+
+    The folders which can not be moved there are deleted right away,
+    reporting the files and bytes removed.
+    """
+    # Number of files and bytes removed so far
+    removed = QtCore.Signal(int, int)
+
+    def __init__(self, packages, local_repo, max_workers, all_version=False):
+        super(DeleteWorker, self).__init__(packages, max_workers)
+        self.local_repo = local_repo
+        self.all_version = all_version
+        # The quarantine entry of each package moved there
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._files = 0
+        self._bytes = 0
+
+    def folder(self, package):
+        """Return the folder to delete for `package`."""
+        return operations.local_folder(package, self.all_version)
+
+    def process(self, package):
+        folder = self.folder(package)
+        try:
+            entry = operations.quarantine(folder, self.local_repo)
+        except OSError:
+            # Like a family folder mounted from another device
+            self.logger.debug(f'Can not quarantine {folder}.', exc_info=True)
+            operations.remove_tree(folder, self._on_removed)
+            return
+        with self._lock:
+            self.entries[package] = entry
+
+    def _on_removed(self, files, size):
+        # Called from the threads of the pool
+        with self._lock:
+            self._files += files
+            self._bytes += size
+            self.removed.emit(self._files, self._bytes)
+
+
+class DeleteFoldersWorker(DeleteWorker):
+    """Delete folders, like the empty folders of package families."""
+
+    def folder(self, package):
+        return package
+
+
+class PurgeWorker(Worker):
+    """Delete for good the old entries of the quarantine folder."""
+
+    def __init__(self, local_repo, older_than):
+        super(PurgeWorker, self).__init__()
+        self.local_repo = local_repo
+        self.older_than = older_than
+
+    def work(self):
+        purged = operations.purge_quarantine(
+            self.local_repo, self.older_than, self.cancelled
+        )
+        if purged:
+            self.logger.info(f'{purged} deleted folder(s) purged.')
+
+
+class SizesWorker(Worker):
+    """Measure the disk usage of package families.
+
+    `jobs` is a list of `(family_name, irepo, repo, version)`, `version` is
+    None for the families without any valid version.
+    """
+    # `{(family_name, irepo): (version_size, all_size)}`
+    sizesComputed = QtCore.Signal(object)
+
+    def __init__(self, jobs, max_workers):
+        super(SizesWorker, self).__init__()
+        self.jobs = jobs
+        self.max_workers = max_workers
+
+    def _measure(self, cache, job):
+        if self.is_cancelled():
+            return None
+        family_name, _, repo, version = job
+        return sizes.family_sizes(repo, family_name, version, cache)
+
+    def work(self):
+        cache = open_scan_cache()
+        batch = {}
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) \
+                    as executor:
+                futures = {
+                    executor.submit(self._measure, cache, job): job
+                    for job in self.jobs
+                }
+                for future in as_completed(futures):
+                    result = future.result()
+                    if result is None:
+                        continue
+                    family_name, irepo = futures[future][:2]
+                    batch[(family_name, irepo)] = result
+                    if len(batch) >= SIZES_BATCH_SIZE:
+                        self.sizesComputed.emit(batch)
+                        batch = {}
+        finally:
+            if cache:
+                cache.close()
+        if batch:
+            self.sizesComputed.emit(batch)
@@ -1,10 +1,17 @@
 import shutil
 import os
+import logging
+import threading
+from collections import Counter
 
 import pytest
 import rez.config
+from Qt import QtCore, QtWidgets
 
-from rez_manager import views, models
+from rez_manager import (
+    views, models, scan, cache, utils, search, report, operations, sizes,
+    workers, watcher, textedithandler,
+)
 
 
 ROOT = os.path.dirname(os.path.dirname(__file__))
@@ -24,8 +31,8 @@ def rez_tmp_folder(tmp_path):
 
 @pytest.fixture
 def packages(rez_tmp_folder):
-    local_repo = f'{rez_tmp_folder}/rez_manager/local'
-    remote_repo = f'{rez_tmp_folder}/rez_manager/remote'
+    local_repo = f'{rez_tmp_folder}/local'
+    remote_repo = f'{rez_tmp_folder}/remote'
 
     config_content = dict(
         packages_path=[local_repo, remote_repo],
@@ -53,3 +60,335 @@ def test_views_get_local_repo_index(packages):
 def test_models_update(qtbot, packages):
     model = models.RezPackagesModel()
     assert model.columnCount() == 3
+
+
+def test_scan_index_repository(packages):
+    repos = rez.config.config.get('packages_path')
+    index = scan.index_repository(repos[1])
+    latest, has_folder = index['pkg_a']
+    assert str(latest.version) == '0.2.0'
+    assert has_folder
+    assert 'pkg_c' not in index
+    # Records do not hold on to the rez packages
+    assert latest._package is None
+
+
+def test_scan_families(packages):
+    repos = rez.config.config.get('packages_path')
+    rows = scan.scan_families(repos, ['pkg_c', 'pkg_missing'])
+    local, remote = rows['pkg_c']
+    assert str(local.latest.version) == '0.2.0'
+    assert not remote.latest and not remote.empty_folder
+    assert not any(cell.latest for cell in rows['pkg_missing'])
+
+
+def test_scan_broken_package(packages):
+    repos = rez.config.config.get('packages_path')
+    broken = os.path.join(repos[0], 'pkg_broken', '1.0.0')
+    os.makedirs(broken)
+    with open(os.path.join(broken, 'package.py'), 'w') as f:
+        f.write('name = "pkg_broken"\nversion = (\n')
+
+    stats = scan.RepoStats(repos[0])
+    listing = scan.list_repository(repos[0])
+    index = scan.index_listing(repos[0], listing, listing[0], stats=stats)
+    assert 'pkg_broken' not in index
+    assert 'pkg_a' in index and 'pkg_c' in index
+    assert stats.errors == 1
+
+    rows = scan.scan_families(repos, ['pkg_a', 'pkg_broken'])
+    assert rows['pkg_a'][0].latest
+    assert not rows['pkg_broken'][0].latest
+    assert scan.scan_versions(repos, 'pkg_broken') == []
+
+
+def test_scan_iter_row_batches_cancelled(packages):
+    repos = rez.config.config.get('packages_path')
+    cancelled = threading.Event()
+    batches = scan.iter_row_batches(
+        repos, 2, batch_size=1, cancelled=cancelled
+    )
+    rows, total = next(batches)
+    assert len(rows) == 1 and total == 3
+
+    cancelled.set()
+    assert list(batches) == []
+
+
+def test_scan_cache(tmp_path):
+    scan_cache = cache.ScanCache(str(tmp_path / 'scan.sqlite'))
+    metadata = dict(
+        description='A', tools=['a'], variants=[['python-3']], timestamp=1,
+    )
+    scan_cache.put('/repo', 'pkg_a', '0.1.0', (1.0, 2.0), metadata)
+
+    assert scan_cache.get('/repo', 'pkg_a', '0.1.0', (1.0, 2.0)) == metadata
+    assert scan_cache.get('/repo', 'pkg_a', '0.1.0', (1.0, 3.0)) is None
+    assert scan_cache.get('/repo', 'pkg_b', '0.1.0', (1.0, 2.0)) is None
+    scan_cache.close()
+
+
+def test_scan_cache_connections_do_not_lock(tmp_path):
+    path = str(tmp_path / 'scan.sqlite')
+    first, second = cache.ScanCache(path), cache.ScanCache(path)
+    metadata = dict(description='A', tools=[], variants=[], timestamp=1)
+    first.put('/repo', 'pkg_a', '0.1.0', (1.0, 2.0), metadata)
+    second.put('/repo', 'pkg_b', '0.1.0', (1.0, 2.0), metadata)
+    second.put_size('/repo/pkg_b/0.1.0', 1.0, 10)
+    assert first.get('/repo', 'pkg_b', '0.1.0', (1.0, 2.0)) == metadata
+    assert first.get_size('/repo/pkg_b/0.1.0', 1.0) == 10
+    first.close()
+    second.close()
+
+
+def test_utils_lru_cache():
+    lru = utils.LRUCache(2)
+    lru['a'] = 1
+    lru['b'] = 2
+    assert lru.get('a') == 1
+    lru['c'] = 3
+    assert lru.get('b') is None
+    assert lru.get('a') == 1
+    assert lru.pop('c') == 3
+    assert len(lru) == 1
+
+
+def test_utils_ring_buffer():
+    ring = utils.RingBuffer(3)
+    for i in range(5):
+        ring.append(i)
+    assert list(ring) == [2, 3, 4]
+    ring.drop(2)
+    ring.append(5)
+    assert list(ring) == [4, 5]
+    with pytest.raises(IndexError):
+        ring[2]
+
+
+def test_utils_format_size():
+    assert utils.format_size(512) == '512 B'
+    assert utils.format_size(1536) == '1.5 KB'
+    assert utils.format_size(3 * 1024 ** 4) == '3.0 TB'
+
+
+def test_models_filter_text(qtbot, packages):
+    model = models.RezPackagesModel()
+    model._add_families(['maya', 'maya_usd', 'houdini'])
+    model.set_filter_text('USD')
+    assert model.rowCount() == 1
+    assert model.index(0, 0).data() == 'maya_usd'
+
+    model.set_filter_text('^hou')
+    model._add_families(['houdini_engine', 'nuke'])
+    assert model.rowCount() == 2
+
+    model.set_filter_text('')
+    assert model.rowCount() == 5
+
+
+def test_models_add_families_sorted_by_repo(qtbot, packages):
+    model = models.RezPackagesModel()
+    model._add_families(['maya'])
+    model.sort(1, QtCore.Qt.DescendingOrder)
+    model._add_families(['houdini'])
+    assert model.rowCount() == 2
+    assert all(family_row.ranks for family_row in model._rows)
+
+
+def test_models_append_rows_skips_known_families(qtbot, packages):
+    model = models.RezPackagesModel()
+    model._add_families(['maya'])
+    model._append_rows([
+        models.FamilyRow('maya', [scan.EMPTY_CELL] * len(model.repos)),
+        models.FamilyRow('nuke', [scan.EMPTY_CELL] * len(model.repos)),
+    ])
+    assert [row.name for row in model._all_rows] == ['maya', 'nuke']
+    assert model.rowCount() == 2
+
+
+def test_models_family_row_shares_empty_cells():
+    cells = [scan.PackageCell(), scan.PackageCell(empty_folder='/pkg_a')]
+    family_row = models.FamilyRow('pkg_a', cells)
+    assert family_row.cells[0] is scan.EMPTY_CELL
+    assert family_row.winner == -1
+    assert not family_row.is_empty()
+
+
+def test_scan_versions(packages):
+    repos = rez.config.config.get('packages_path')
+    versions = scan.scan_versions(repos, 'pkg_a')
+    assert [str(version) for version, _ in versions] == ['0.2.0', '0.1.0']
+
+    _, (local, remote) = versions[0]
+    assert local is scan.EMPTY_CELL
+    assert str(remote.latest.version) == '0.2.0'
+
+
+def test_search_family_name_index():
+    name_index = search.FamilyNameIndex(['maya', 'maya_usd', 'houdini'])
+    assert name_index.search('MAYA') == {'maya', 'maya_usd'}
+    assert name_index.search('usd') == {'maya_usd'}
+    assert name_index.search('a_u') == {'maya_usd'}
+    assert name_index.prefixed('hou') == {'houdini'}
+
+    name_index.discard('maya_usd')
+    assert name_index.search('maya') == {'maya'}
+
+
+def test_scan_repo_stats(packages):
+    repos = rez.config.config.get('packages_path')
+    stats = [scan.RepoStats(repo) for repo in repos]
+    list(scan.iter_row_batches(repos, 2, stats=stats))
+
+    local, remote = [repo_stats.snapshot() for repo_stats in stats]
+    assert local['families_listed'] == 2
+    assert remote['packages_loaded'] == 2
+    assert len(remote['slowest']) == 2
+    assert not remote['errors']
+
+
+def test_report_records(packages):
+    local, remote = rez.config.config.get('packages_path')
+    records = {
+        record['family']: record
+        for record in report.iter_records([local, remote], 2)
+    }
+    assert list(records) == ['pkg_a', 'pkg_b', 'pkg_c']
+    assert records['pkg_a']['versions'] == {local: '0.1.0', remote: '0.2.0'}
+    assert records['pkg_a']['winner'] == remote
+    assert records['pkg_a']['shadowed'] == [local]
+
+
+def test_operations_matching_variants():
+    package = scan.PackageRecord('a', '1', '/', variants=[
+        ['platform-linux', 'python-3'],
+        ['platform-windows', 'python-3'],
+        ['platform-linux', 'python-2'],
+    ])
+    assert operations.matching_variants(
+        package, ['~platform==linux', 'python-3.9']
+    ) == [0]
+    assert operations.matching_variants(package, []) == [0, 1, 2]
+
+
+def test_operations_link_tree(tmp_path):
+    src = tmp_path / 'src'
+    (src / 'bin').mkdir(parents=True)
+    (src / 'bin' / 'tool').write_text('tool')
+    (src / 'package.py').write_text('name = "a"')
+
+    counts = Counter()
+    operations.link_tree(
+        str(src), str(tmp_path / 'dst'), [os.link], counts,
+        skip=operations.PACKAGE_FILES,
+    )
+    assert (tmp_path / 'dst' / 'bin' / 'tool').read_text() == 'tool'
+    assert not (tmp_path / 'dst' / 'package.py').exists()
+    assert counts == Counter(link=1)
+
+
+def test_operations_remove_tree(tmp_path):
+    folder = tmp_path / 'pkg'
+    (folder / '1.0' / 'bin').mkdir(parents=True)
+    (folder / '1.0' / 'bin' / 'tool').write_text('tool')
+    (folder / '1.0' / 'package.py').write_text('name = "a"')
+
+    reports = []
+    removed = operations.remove_tree(
+        str(folder), lambda files, size: reports.append((files, size))
+    )
+    assert removed == (2, 14)
+    assert reports == [removed]
+    assert not folder.exists()
+
+
+def test_operations_quarantine(tmp_path):
+    folder = tmp_path / 'pkg' / '1.0'
+    folder.mkdir(parents=True)
+    (folder / 'package.py').write_text('name = "pkg"')
+
+    entry = operations.quarantine(str(folder), str(tmp_path))
+    assert not folder.exists()
+    assert operations.purge_quarantine(str(tmp_path), 60) == 0
+    assert operations.restore(entry) == str(folder)
+    assert (folder / 'package.py').exists()
+
+    operations.quarantine(str(folder), str(tmp_path))
+    assert operations.purge_quarantine(str(tmp_path), 0) == 1
+    assert not os.listdir(tmp_path / operations.QUARANTINE_FOLDER)
+
+
+def test_sizes_family_sizes(tmp_path):
+    for version, size in [('1.0', 10), ('2.0', 20)]:
+        (tmp_path / 'pkg' / version / 'bin').mkdir(parents=True)
+        (tmp_path / 'pkg' / version / 'bin' / 'tool').write_bytes(b'x' * size)
+
+    scan_cache = cache.ScanCache(str(tmp_path / 'scan.sqlite'))
+    assert sizes.family_sizes(str(tmp_path), 'pkg', '2.0', scan_cache) == \
+        (20, 30)
+    folder = str(tmp_path / 'pkg' / '1.0')
+    assert scan_cache.get_size(folder, os.stat(folder).st_mtime) == 10
+    assert sizes.family_sizes(str(tmp_path), 'pkg') == (None, 30)
+    scan_cache.close()
+
+
+def test_sizes_same_device(tmp_path):
+    assert sizes.same_device(str(tmp_path), str(tmp_path / 'not' / 'yet'))
+
+
+def test_workers_packages_worker_reports_failures(qtbot):
+    class FailingWorker(workers.PackagesWorker):
+        def process(self, package):
+            if package == 'pkg_b':
+                raise ValueError('Broken package')
+
+    worker = FailingWorker(['pkg_a', 'pkg_b', 'pkg_c'], 2)
+    errors = {}
+    worker.packageDone.connect(
+        lambda package, error: errors.update({package: error})
+    )
+    worker.work()
+    assert errors == {'pkg_a': '', 'pkg_b': 'Broken package', 'pkg_c': ''}
+
+
+def test_watcher_reports_changed_families(qtbot, tmp_path):
+    (tmp_path / 'pkg_a').mkdir()
+    repo_watcher = watcher.RepositoryWatcher(str(tmp_path))
+    repo_watcher.start()
+    reported = []
+    repo_watcher.familiesChanged.connect(reported.append)
+
+    (tmp_path / 'pkg_b').mkdir()
+    # A burst of events is reported once, after the debounce delay
+    with qtbot.waitSignal(repo_watcher.familiesChanged, timeout=2000):
+        repo_watcher._on_directory_changed(str(tmp_path))
+        repo_watcher._on_directory_changed(str(tmp_path / 'pkg_a'))
+        repo_watcher._on_directory_changed(str(tmp_path / 'pkg_a'))
+        assert not reported
+    assert reported == [['pkg_a', 'pkg_b']]
+    repo_watcher.stop()
+
+
+def test_textedithandler_batches_and_caps_messages(qtbot):
+    textedit = QtWidgets.QTextEdit()
+    qtbot.addWidget(textedit)
+    handler = textedithandler.TextEditHandler(textedit, max_blocks=3)
+
+    def emit(i):
+        handler.emit(logging.LogRecord(
+            'rez_manager', logging.INFO, __file__, 0, f'Message {i}', None,
+            None,
+        ))
+
+    for i in range(5):
+        emit(i)
+    # Nothing is appended until the batch is flushed
+    assert textedit.document().isEmpty()
+    handler.flush_records()
+    assert textedit.toPlainText().split('\n') == [
+        'Message 2', 'Message 3', 'Message 4'
+    ]
+
+    emit(5)
+    qtbot.waitUntil(lambda: 'Message 5' in textedit.toPlainText())
+    assert textedit.document().blockCount() == 3